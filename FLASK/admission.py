@@ -0,0 +1,193 @@
+"""准入控制：令牌桶限流 + 模型调用并发上限
+
+请求在进入路由之前先过准入检查，超限的请求尽早拒绝，不去占用数据库连接池、发号锁和模型服务：
+- 令牌桶：每个路由按 用户 / IP / 路由整体 各一个桶（rate 个/秒补充，最多攒 burst 个），
+  一次检查中所有桶都有令牌才一起扣减，任一不足返回 429 和 Retry-After（按缺少的令牌数折算的秒数）；
+- 跨进程共享：open(path) 后桶的状态存放在共享 SQLite 文件中，每次检查一个短的写事务，
+  所有工作进程看到的是同一组桶；不设置时只在本进程内计数。共享文件读写失败时放行（不因限流故障拒绝正常请求）；
+- 并发上限：ConcurrencyGate 限制本进程同时调用模型的请求数，已满时最多排队 max_queue 个、每个最多等待 max_wait 秒，
+  仍拿不到名额返回 503 和 Retry-After。
+"""
+import math
+import os
+import sqlite3
+import threading
+import time
+
+
+class Overloaded(Exception):
+    """准入检查未通过：status 为 429（超过限流）或 503（并发已满），retry_after 为建议的重试秒数"""
+
+    def __init__(self, status: int, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.status = status
+        self.reason = reason
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+def parse_limit(spec: str) -> tuple:
+    """"5/20" -> (每秒 5 个, 最多攒 20 个)；"0"、空或补充速率不大于 0（如 "0/20"）都表示不限"""
+    if not spec or spec.strip() == "0":
+        return None
+    rate, _, burst = spec.partition("/")
+    rate = float(rate)
+    if rate <= 0:
+        return None   # 不补充的桶用完就永远拒绝，且无法折算 Retry-After
+    return rate, float(burst) if burst else max(rate, 1.0)
+
+
+def parse_limits(spec: str) -> dict:
+    """"user=5/20,ip=10/40,route=200/400" -> {"user": (5, 20), ...}"""
+    limits = {}
+    for part in (spec or "").split(","):
+        if "=" in part:
+            scope, _, value = part.partition("=")
+            limits[scope.strip()] = parse_limit(value.strip())
+    return limits
+
+
+class TokenBucketLimiter:
+    def __init__(self, cleanup_interval: float = 60, idle_ttl: float = 3600):
+        self.cleanup_interval = cleanup_interval
+        self.idle_ttl = idle_ttl        # 这么久没用过的桶早已攒满，删掉即可
+        self.path = None
+        self._buckets = {}              # 本进程模式：键 -> (令牌数, 更新时间)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._last_cleanup = time.time()
+        self._stats = {"checks": 0, "rejected": 0, "store_errors": 0}
+
+    def open(self, path: str):
+        """启用跨进程共享：桶状态存放在 path 指向的 SQLite 文件中"""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        conn = self._connect()
+        try:
+            conn.execute("CREATE TABLE IF NOT EXISTS token_bucket ("
+                         "key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)")
+        finally:
+            conn.close()
+        return self
+
+    @staticmethod
+    def _refill(state, rate, burst, now) -> float:
+        if state is None:
+            return burst
+        tokens, updated = state
+        return min(burst, tokens + max(0.0, now - updated) * rate)
+
+    def acquire(self, checks, cost: float = 1.0, now: float = None) -> tuple:
+        """checks: [(键, 每秒补充数, 容量)]；全部有令牌时一起扣减，返回 (是否放行, 失败的键, 建议等待秒数)"""
+        now = now or time.time()
+        self._stats["checks"] += 1
+        if self.path:
+            try:
+                return self._acquire_shared(checks, cost, now)
+            except sqlite3.Error as e:
+                self._stats["store_errors"] += 1
+                print("限流共享文件读写失败，本次放行:", e)
+                return True, None, 0.0
+        with self._lock:
+            return self._decide(checks, cost, now, self._buckets.get, self._buckets.__setitem__)
+
+    def _decide(self, checks, cost, now, load, store) -> tuple:
+        levels = []
+        for key, rate, burst in checks:
+            tokens = self._refill(load(key), rate, burst, now)
+            if tokens < cost:
+                self._stats["rejected"] += 1
+                return False, key, (cost - tokens) / rate
+            levels.append((key, tokens))
+        for key, tokens in levels:
+            store(key, (tokens - cost, now))
+        return True, None, 0.0
+
+    # ---------------- 跨进程共享 ----------------
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=1, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=OFF")     # 限流状态丢了只是重新攒满，不需要落盘
+        return conn
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = self._local.conn = self._connect()
+            self._local.pid = os.getpid()
+        return conn
+
+    def _acquire_shared(self, checks, cost, now) -> tuple:
+        conn = self._conn()
+        keys = [key for key, _, _ in checks]
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute(f"SELECT key, tokens, updated FROM token_bucket WHERE key IN "
+                                f"({','.join('?' * len(keys))})", keys).fetchall()
+            current = {key: (tokens, updated) for key, tokens, updated in rows}
+            changed = []
+            result = self._decide(checks, cost, now, current.get, lambda k, v: changed.append((k, *v)))
+            if changed:
+                conn.executemany("INSERT OR REPLACE INTO token_bucket (key, tokens, updated) VALUES (?, ?, ?)",
+                                 changed)
+            if now - self._last_cleanup > self.cleanup_interval:
+                self._last_cleanup = now
+                conn.execute("DELETE FROM token_bucket WHERE updated < ?", (now - self.idle_ttl,))
+            conn.execute("COMMIT")
+            return result
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+
+    def stats(self) -> dict:
+        data = dict(self._stats, shared=self.path)
+        if not self.path:
+            with self._lock:
+                data["buckets"] = len(self._buckets)
+        return data
+
+
+class ConcurrencyGate:
+    """本进程同时调用模型的请求数上限；名额已满时有限排队，排不上或等待超时则拒绝"""
+
+    def __init__(self, limit: int, max_queue: int = 0, max_wait: float = 0.5):
+        self.limit = limit
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.in_use = 0
+        self.waiting = 0
+        self._cond = threading.Condition()
+        self._stats = {"admitted": 0, "rejected": 0}
+
+    def acquire(self) -> float:
+        """拿到名额返回排队等待的秒数，拿不到抛出 Overloaded(503)"""
+        started = time.perf_counter()
+        with self._cond:
+            if self.in_use >= self.limit:
+                if self.waiting >= self.max_queue:
+                    self._stats["rejected"] += 1
+                    raise Overloaded(503, "overload", self.max_wait or 1)
+                self.waiting += 1
+                try:
+                    deadline = started + self.max_wait
+                    while self.in_use >= self.limit:
+                        remaining = deadline - time.perf_counter()
+                        if remaining <= 0 or not self._cond.wait(remaining):
+                            if self.in_use >= self.limit:
+                                self._stats["rejected"] += 1
+                                raise Overloaded(503, "overload", self.max_wait or 1)
+                finally:
+                    self.waiting -= 1
+            self.in_use += 1
+            self._stats["admitted"] += 1
+        return time.perf_counter() - started
+
+    def release(self):
+        with self._cond:
+            self.in_use -= 1
+            self._cond.notify()
+
+    def stats(self) -> dict:
+        with self._cond:
+            return dict(self._stats, limit=self.limit, in_use=self.in_use, waiting=self.waiting,
+                        max_queue=self.max_queue, max_wait=self.max_wait)
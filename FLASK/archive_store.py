@@ -0,0 +1,264 @@
+"""sms_record 冷数据归档
+
+sms_record 只保留最近 hot_days 天的记录（热数据），更早的记录连同用户名按天写入压缩文件：
+- 文件：root/YYYY/MM/YYYY-MM-DD-<最小id>-<最大id>.ndjson.gz，每行一条记录，行按 id 升序；
+  一块记录涉及几天就写几个文件，写完（临时文件 + 改名）后才登记；
+- 清单：sms_archive_segment 表每个文件一行（日期、id 范围、条数、按 类型 × 是否诈骗 的条数），
+  与删除热数据在同一个事务中写入，事务回滚时新写的文件没有登记、读取时不会看到，
+  下次归档时清理掉；只有登记在清单中的文件才算数；
+- 查询：按日期区间只打开对应日期的文件，按 id 顺序逐个读取、取满一页即停（id 范围重叠的文件才归并），
+  结果与在一张表里按 id 排序相同；按类型、是否诈骗筛选时总数取自清单，不扫描；
+- 统计：归档不扣减 sms_stat_daily，/admin/stats 照常包含归档的记录。
+
+删除用户、按类别重置时，含有匹配记录的文件整体重写（写新文件、在同一事务中替换清单，
+提交后再删旧文件），并返回需要扣减的统计量。
+"""
+import gzip
+import heapq
+import json
+import os
+import time
+from collections import Counter
+from datetime import date, datetime
+
+from sqlalchemy import delete, func, insert, select, update
+
+FIELDS = ("id", "user_id", "username", "case_no", "sms_text", "is_fraud", "fraud_type", "detail",
+          "rule_version", "created_at")
+
+
+def _summary_key(fraud_type, is_fraud) -> str:
+    return f"{fraud_type or ''}|{int(bool(is_fraud))}"
+
+
+class ArchiveStore:
+    def __init__(self, root: str, record_table, user_table, segment_table, hot_days: int = 90):
+        self.root = root
+        self.records = record_table
+        self.users = user_table
+        self.segments = segment_table
+        self.hot_days = hot_days
+
+    def cutoff(self, hot_days: int = None) -> datetime:
+        """早于此时间的记录会被归档（按天对齐）"""
+        days = self.hot_days if hot_days is None else hot_days
+        return datetime.combine(date.fromordinal(date.today().toordinal() - days), datetime.min.time())
+
+    # ---------------- 写入 ----------------
+    def _write(self, day: date, rows: list, tag: str = "") -> tuple:
+        """写一个分区文件，返回 (相对路径, 字节数)；tag 用于重写时生成不同的文件名"""
+        name = f"{day.isoformat()}-{rows[0]['id']}-{rows[-1]['id']}{tag}.ndjson.gz"
+        rel = os.path.join(f"{day:%Y}", f"{day:%m}", name)
+        path = os.path.join(self.root, rel)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with gzip.open(tmp, "wt", encoding="utf-8", compresslevel=6) as f:
+            for row in rows:
+                f.write(json.dumps(row, ensure_ascii=False, separators=(",", ":")) + "\n")
+        os.replace(tmp, path)
+        return rel, os.path.getsize(path)
+
+    def _segment_values(self, day, rows, rel, size) -> dict:
+        summary = Counter(_summary_key(r["fraud_type"], r["is_fraud"]) for r in rows)
+        return {"day": day, "min_id": rows[0]["id"], "max_id": rows[-1]["id"], "rows": len(rows), "bytes": size,
+                "path": rel, "summary": json.dumps(summary, ensure_ascii=False), "created_at": datetime.now()}
+
+    def archive_chunk(self, session, ids) -> int:
+        """把这些记录写入归档文件并从 sms_record 删除（在调用方的事务中登记和删除，不提交）"""
+        t, u = self.records, self.users
+        result = session.execute(
+            select(t.c.id, t.c.user_id, u.c.username, t.c.case_no, t.c.sms_text, t.c.is_fraud, t.c.fraud_type,
+                   t.c.detail, t.c.rule_version, t.c.created_at)
+            .outerjoin(u, t.c.user_id == u.c.id).where(t.c.id.in_(ids)).order_by(t.c.id)
+        ).fetchall()
+        by_day = {}
+        for row in result:
+            item = dict(zip(FIELDS, row))
+            item["is_fraud"] = bool(item["is_fraud"])
+            created = item["created_at"] or datetime.now()
+            item["created_at"] = created.isoformat(sep=" ")
+            by_day.setdefault(created.date(), []).append(item)
+        written = []
+        try:
+            for day, rows in sorted(by_day.items()):
+                rel, size = self._write(day, rows)
+                written.append(rel)
+                session.execute(insert(self.segments).values(**self._segment_values(day, rows, rel, size)))
+            deleted = session.execute(delete(t).where(t.c.id.in_([r[0] for r in result]))).rowcount
+            if deleted != len(result):
+                raise RuntimeError("归档期间记录被其他操作删除，本块放弃")
+        except Exception:
+            self._remove(written)
+            raise
+        return len(result)
+
+    # ---------------- 读取 ----------------
+    def list_segments(self, conn, start: date = None, end: date = None) -> list:
+        """日期区间内的文件（按最小 id 排序）"""
+        s = self.segments
+        stmt = select(s.c.id, s.c.day, s.c.min_id, s.c.max_id, s.c.rows, s.c.path, s.c.summary)
+        if start is not None:
+            stmt = stmt.where(s.c.day >= start)
+        if end is not None:
+            stmt = stmt.where(s.c.day <= end)
+        return conn.execute(stmt.order_by(s.c.min_id)).fetchall()
+
+    def read_segment(self, rel: str):
+        with gzip.open(os.path.join(self.root, rel), "rt", encoding="utf-8") as f:
+            for line in f:
+                yield json.loads(line)
+
+    @staticmethod
+    def _runs(segments) -> list:
+        """按最小 id 排好序的文件分组：id 范围有重叠的文件归为一组（一般每组只有一个文件）"""
+        runs = []
+        for seg in segments:
+            if runs and seg.min_id <= max(s.max_id for s in runs[-1]):
+                runs[-1].append(seg)
+            else:
+                runs.append([seg])
+        return runs
+
+    def _read_run(self, run):
+        if len(run) == 1:
+            return self.read_segment(run[0].path)
+        return heapq.merge(*(self.read_segment(seg.path) for seg in run), key=lambda r: r["id"])
+
+    @staticmethod
+    def _count(seg, fraud_type, is_fraud) -> int:
+        """按清单中的 类型 × 是否诈骗 条数算出文件中符合条件的条数，不解压"""
+        if fraud_type is None and is_fraud is None:
+            return seg.rows
+        n = 0
+        for key, count in json.loads(seg.summary).items():
+            t, f = key.rsplit("|", 1)
+            if (fraud_type is None or t == fraud_type) and (is_fraud is None or (f == "1") == is_fraud):
+                n += count
+        return n
+
+    def query(self, conn, start: date = None, end: date = None, fraud_type: str = None, is_fraud: bool = None,
+              predicate=None, offset: int = 0, limit: int = 10) -> tuple:
+        """按 id 升序取归档记录，返回 (符合条件的总条数, 第 offset 条起的 limit 条, 总数是否精确)
+
+        fraud_type / is_fraud 的条数取自清单：总数不需要扫描，翻页时整份跳过前面的文件；
+        文件按 id 顺序逐个（重叠的一组）打开，取满一页即停止。
+        另有 predicate(row)（如关键词）时只能逐行匹配，页取满后未读的文件按清单条数计入总数（上限），此时总数不精确。
+        """
+        runs = self._runs(self.list_segments(conn, start, end))
+        counts = [sum(self._count(seg, fraud_type, is_fraud) for seg in run) for run in runs]
+
+        def match(row):
+            if fraud_type is not None and (row["fraud_type"] or "") != fraud_type:
+                return False
+            if is_fraud is not None and bool(row["is_fraud"]) != is_fraud:
+                return False
+            return predicate is None or predicate(row)
+
+        total, page, exact = 0, [], True
+        for i, (run, n) in enumerate(zip(runs, counts)):
+            if len(page) >= limit:
+                total += sum(counts[i:])
+                exact = exact and predicate is None
+                break
+            if not n or (predicate is None and offset >= n):
+                offset -= n
+                total += n
+                continue
+            found, complete = 0, True
+            for row in self._read_run(run):
+                if not match(row):
+                    continue
+                if offset:
+                    offset -= 1
+                elif len(page) < limit:
+                    page.append(row)
+                else:
+                    complete = False    # 页已取满，这一组剩下的不再读
+                    break
+                found += 1
+            if predicate is not None and complete:
+                total += found
+            else:
+                total += n
+                exact = exact and predicate is None
+        return total, page, exact
+
+    def summary(self, conn) -> Counter:
+        """归档记录的 {(日期, 类型, 是否诈骗): 条数}，用于重建统计汇总表"""
+        counts = Counter()
+        for seg in self.list_segments(conn):
+            for key, n in json.loads(seg.summary).items():
+                fraud_type, is_fraud = key.rsplit("|", 1)
+                counts[(seg.day, fraud_type, is_fraud == "1")] += n
+        return counts
+
+    # ---------------- 删除 ----------------
+    def purge(self, session, predicate) -> tuple:
+        """删除归档中符合条件的记录（在调用方的事务中替换清单，不提交）
+
+        返回 (统计减量 Counter, 提交后要删除的旧文件列表)
+        """
+        deltas, stale, written = Counter(), [], []
+        try:
+            for seg in self.list_segments(session):
+                rows = list(self.read_segment(seg.path))
+                keep = [r for r in rows if not predicate(r)]
+                if len(keep) == len(rows):
+                    continue
+                for r in rows:
+                    if predicate(r):
+                        deltas[(seg.day, r["fraud_type"] or "", bool(r["is_fraud"]))] -= 1
+                stale.append(seg.path)
+                if keep:
+                    # 写成新文件，事务回滚时旧文件仍然有效
+                    rel, size = self._write(seg.day, keep, tag=f"-r{time.time_ns():x}")
+                    written.append(rel)
+                    values = self._segment_values(seg.day, keep, rel, size)
+                    session.execute(update(self.segments).where(self.segments.c.id == seg.id).values(**values))
+                else:
+                    session.execute(delete(self.segments).where(self.segments.c.id == seg.id))
+        except Exception:
+            self._remove(written)
+            raise
+        return deltas, stale
+
+    def drop_all(self, session) -> list:
+        """清空清单（在调用方的事务中），返回提交后要删除的文件"""
+        paths = [row[0] for row in session.execute(select(self.segments.c.path))]
+        session.execute(delete(self.segments))
+        return paths
+
+    def _remove(self, paths):
+        for rel in paths:
+            try:
+                os.remove(os.path.join(self.root, rel))
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                print("删除归档文件失败:", rel, e)
+
+    def remove_files(self, paths):
+        self._remove(paths)
+
+    def sweep(self, conn, min_age: float = 3600) -> int:
+        """删除没有登记在清单中的文件（事务回滚或进程中途退出留下的），只处理 min_age 秒前的文件"""
+        if not os.path.isdir(self.root):
+            return 0
+        known = {os.path.normpath(row[0]) for row in conn.execute(select(self.segments.c.path))}
+        now, removed = time.time(), 0
+        for dirpath, _, files in os.walk(self.root):
+            for name in files:
+                path = os.path.join(dirpath, name)
+                rel = os.path.normpath(os.path.relpath(path, self.root))
+                if rel not in known and now - os.path.getmtime(path) > min_age:
+                    self._remove([rel])
+                    removed += 1
+        return removed
+
+    def stats(self, conn) -> dict:
+        s = self.segments
+        row = conn.execute(select(func.count(), func.sum(s.c.rows), func.sum(s.c.bytes),
+                                  func.min(s.c.day), func.max(s.c.day))).first()
+        return {"segments": row[0], "records": int(row[1] or 0), "bytes": int(row[2] or 0),
+                "oldest_day": str(row[3]) if row[3] else None, "newest_day": str(row[4]) if row[4] else None,
+                "hot_days": self.hot_days, "root": self.root}
@@ -0,0 +1,75 @@
+"""对比两次压测结果，标出退化的场景
+
+用法：python bench/compare.py 旧结果.json 新结果.json [--threshold 10]
+p95 延迟上升、吞吐下降或每请求查询数增加超过阈值（百分比）即视为退化，存在退化时退出码为 1。
+"""
+import argparse
+import json
+import sys
+
+
+def _change(old, new):
+    if old in (None, 0) or new is None:
+        return None
+    return (new - old) / old * 100
+
+
+def compare(old: dict, new: dict, threshold: float) -> list:
+    """返回 [(场景, 指标, 旧值, 新值, 变化百分比, 是否退化)]"""
+    rows = []
+    for name, new_result in new.get("scenarios", {}).items():
+        old_result = old.get("scenarios", {}).get(name)
+        if not old_result:
+            continue
+        # (指标名, 取值函数, 数值越大越差)
+        metrics = [
+            ("p95_ms", lambda r: r["latency_ms"]["p95"], True),
+            ("p99_ms", lambda r: r["latency_ms"]["p99"], True),
+            ("rps", lambda r: r["rps"], False),
+            ("queries/req", lambda r: r["db_queries_per_request"], True),
+            ("errors", lambda r: r["errors"], True),
+        ]
+        for metric, get, higher_is_worse in metrics:
+            before, after = get(old_result), get(new_result)
+            change = _change(before, after)
+            if metric == "errors":
+                worse = (after or 0) > (before or 0)
+            else:
+                worse = change is not None and (change > threshold if higher_is_worse else change < -threshold)
+            rows.append((name, metric, before, after, change, worse))
+    for name, new_result in new.get("micro", {}).items():
+        old_result = old.get("micro", {}).get(name, {})
+        for metric, after in new_result.items():
+            if not metric.endswith("us_per_call") or metric not in old_result:
+                continue
+            change = _change(old_result[metric], after)
+            rows.append((name, metric, old_result[metric], after, change,
+                         change is not None and change > threshold))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="对比两次压测结果")
+    parser.add_argument("old")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=10.0, help="退化判定阈值（百分比）")
+    args = parser.parse_args()
+    with open(args.old, encoding="utf-8") as f:
+        old = json.load(f)
+    with open(args.new, encoding="utf-8") as f:
+        new = json.load(f)
+
+    print(f"旧：{old['meta']['revision']} ({old['meta']['timestamp']})  新：{new['meta']['revision']} ({new['meta']['timestamp']})")
+    rows = compare(old, new, args.threshold)
+    regressions = 0
+    for name, metric, before, after, change, worse in rows:
+        change_text = f"{change:+.1f}%" if change is not None else "-"
+        flag = "  <-- 退化" if worse else ""
+        regressions += worse
+        print(f"{name:20s} {metric:24s} {before!s:>10} -> {after!s:>10} {change_text:>9}{flag}")
+    print(f"共 {regressions} 项退化（阈值 {args.threshold}%）")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
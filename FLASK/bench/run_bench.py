@@ -0,0 +1,355 @@
+"""接口压测与微基准
+
+在本地数据库（默认临时 SQLite 文件，也可用 --database-url 指向一次性的 MySQL 库）和
+模型服务替身（bench/stub_model.py，延迟、失败率可配）上启动 myflask_8-1.py 中的应用，
+按指定并发驱动主要接口，统计 p50/p95/p99 延迟、每秒请求数、每个请求的数据库查询次数和耗时；
+另外对 mock_model 和 gen_case_no 做微基准。结果写成 JSON，便于用 bench/compare.py 对比不同版本。
+
+示例（在 FLASK 目录下执行）：
+    python bench/run_bench.py --concurrency 16 --requests 500 --model-latency-ms 30
+    python bench/run_bench.py --model-failure-rate 1 --out bench/results/model_down.json
+    python bench/compare.py bench/results/old.json bench/results/new.json
+"""
+import argparse
+import importlib.util
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import requests
+from werkzeug.serving import make_server
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+FLASK_DIR = os.path.dirname(BENCH_DIR)
+APP_PATH = os.path.join(FLASK_DIR, "myflask_8-1.py")
+sys.path.insert(0, FLASK_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from stub_model import StubModelServer  # noqa: E402
+
+SAMPLE_TEXTS = [
+    "【淘宝】您好，您的包裹丢失，客服将为您办理退款赔付，请添加微信。",
+    "兼职刷单，日结返利，做任务点赞就能赚钱，详情加QQ。",
+    "我是你领导，明天来我办公室一趟，现在方便转账吗？有急事。",
+    "您的征信有信用污点，联系我们可帮您消除记录。",
+    "今晚一起吃饭吗？老地方见。",
+    "您尾号1234的信用卡额度已提升，无抵押秒批贷款请回复。",
+    "这里是公安局，您涉嫌洗钱已被通缉，请配合调查。",
+    "周末的会议改到下午三点，请准时参加。",
+]
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=FLASK_DIR,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return "unknown"
+
+
+def load_app(database_url: str, model_url: str):
+    """以独立模块名加载 myflask_8-1.py（文件名带连字符，不能直接 import）并创建应用"""
+    os.environ["DATABASE_URL"] = database_url
+    os.environ["MODEL_URL"] = model_url
+    spec = importlib.util.spec_from_file_location("myflask_bench_app", APP_PATH)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    module.app = module.create_app()
+    return module
+
+
+class QueryCounter:
+    """统计每个请求执行的 SQL 条数和耗时（只统计请求线程，不含后台线程）"""
+
+    def __init__(self, app_module):
+        from sqlalchemy import event
+        self._local = threading.local()
+        self.samples = []      # (路由, 查询次数, 查询耗时秒)
+        self._lock = threading.Lock()
+        app = app_module.app
+        with app.app_context():
+            engine = app_module.db.engine
+
+        @event.listens_for(engine, "before_cursor_execute")
+        def before(conn, cursor, statement, parameters, context, executemany):
+            if getattr(self._local, "active", False):
+                self._local.started = time.perf_counter()
+
+        @event.listens_for(engine, "after_cursor_execute")
+        def after(conn, cursor, statement, parameters, context, executemany):
+            if getattr(self._local, "active", False):
+                self._local.count += 1
+                self._local.seconds += time.perf_counter() - self._local.started
+
+        @app.before_request
+        def start_request():
+            self._local.active = True
+            self._local.count = 0
+            self._local.seconds = 0.0
+
+        @app.teardown_request
+        def end_request(exc):
+            from flask import request
+            if getattr(self._local, "active", False):
+                rule = request.url_rule.rule if request.url_rule else request.path
+                with self._lock:
+                    self.samples.append((rule, self._local.count, self._local.seconds))
+            self._local.active = False
+
+    def take(self):
+        with self._lock:
+            samples, self.samples = self.samples, []
+        return samples
+
+
+def seed(app_module, users: int, records: int, reports: int):
+    """建表并写入压测用的用户、短信记录和举报记录"""
+    m = app_module
+    with m.app.app_context():
+        m.db.create_all()
+        m.db.session.add(m.User(username="admin", password="admin123", role="admin"))
+        for i in range(users):
+            m.db.session.add(m.User(username=f"bench{i}", password="123456", role="user"))
+        m.db.session.commit()
+        user_ids = [u.id for u in m.User.query.all()]
+        rows = []
+        for i in range(records):
+            text = random.choice(SAMPLE_TEXTS)
+            result = m.mock_model(text)
+            # 预置记录用 y 类别编号，避免与压测时分配的编号冲突
+            rows.append({"user_id": random.choice(user_ids), "case_no": f"y{i:05d}", "sms_text": text,
+                         "is_fraud": result["is_fraud"], "fraud_type": result["fraud_type"],
+                         "detail": result["analysis_detail"]})
+        for start in range(0, len(rows), 1000):
+            m.db.session.execute(m.db.insert(m.SmsRecord), rows[start:start + 1000])
+        m.db.session.execute(m.db.insert(m.ReportRecord), [
+            {"user_id": random.choice(user_ids), "report_type": random.choice(["sms", "call", "website", "app", "other"]),
+             "content": random.choice(SAMPLE_TEXTS), "source_info": f"1380000{i:04d}"}
+            for i in range(reports)
+        ]) if reports else None
+        m.stats_rollup.rebuild(m.db.session, m.SmsStatDaily.__table__, m.SmsRecord.__table__)
+        m.db.session.commit()
+
+
+def scenarios(data_table: str) -> dict:
+    """场景名 -> (登录身份, 方法, 路径函数, 请求体函数)"""
+    return {
+        "login": (None, "POST", lambda i: "/try/login",
+                  lambda i: {"username": f"bench{i % 4}", "password": "123456"}),
+        "analyze_text": ("user", "POST", lambda i: "/analyze_text",
+                         lambda i: {"短信文本": random.choice(SAMPLE_TEXTS) + str(i)}),
+        "report_submit": (None, "POST", lambda i: "/api/report/submit",
+                          lambda i: {"type": "sms", "content": random.choice(SAMPLE_TEXTS), "source": f"139{i:08d}"}),
+        "sms_records": ("admin", "GET", lambda i: f"/admin/sms_records?page={random.randint(1, 50)}&per_page=20",
+                        None),
+        "sms_records_search": ("admin", "GET", lambda i: "/admin/sms_records?per_page=20&search_keyword=退款",
+                               None),
+        "stats": ("admin", "GET", lambda i: "/admin/stats", None),
+        "table_data": ("admin", "GET", lambda i: f"/admin/data/{data_table}", None),
+    }
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * p))]
+
+
+def login(session: requests.Session, base: str, role: str):
+    if role == "admin":
+        session.post(f"{base}/try/login", json={"username": "admin", "password": "admin123"})
+    elif role == "user":
+        session.post(f"{base}/try/login", json={"username": "bench0", "password": "123456"})
+
+
+def run_scenario(base, name, spec, concurrency, total, counter) -> dict:
+    role, method, path_fn, body_fn = spec
+    latencies, errors = [], 0
+    lock = threading.Lock()
+    sessions = []
+    for _ in range(concurrency):
+        s = requests.Session()
+        login(s, base, role)
+        sessions.append(s)
+    counter.take()
+    next_index = iter(range(total))
+
+    def worker(session):
+        nonlocal errors
+        while True:
+            with lock:
+                i = next(next_index, None)
+            if i is None:
+                return
+            start = time.perf_counter()
+            try:
+                r = session.request(method, base + path_fn(i), json=body_fn(i) if body_fn else None, timeout=30)
+                ok = r.status_code < 400
+            except requests.RequestException:
+                ok = False
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                if not ok:
+                    errors += 1
+
+    wall = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(worker, sessions))
+    wall = time.perf_counter() - wall
+    samples = counter.take()
+    latencies.sort()
+    return {
+        "requests": total,
+        "errors": errors,
+        "concurrency": concurrency,
+        "rps": round(total / wall, 2) if wall else None,
+        "latency_ms": {
+            "mean": round(sum(latencies) / len(latencies) * 1000, 3) if latencies else None,
+            "p50": round(percentile(latencies, 0.50) * 1000, 3) if latencies else None,
+            "p95": round(percentile(latencies, 0.95) * 1000, 3) if latencies else None,
+            "p99": round(percentile(latencies, 0.99) * 1000, 3) if latencies else None,
+            "max": round(latencies[-1] * 1000, 3) if latencies else None,
+        },
+        "db_queries_per_request": round(sum(s[1] for s in samples) / len(samples), 2) if samples else None,
+        "db_ms_per_request": round(sum(s[2] for s in samples) / len(samples) * 1000, 3) if samples else None,
+    }
+
+
+def micro_mock_model(app_module, iterations: int) -> dict:
+    texts = SAMPLE_TEXTS * (iterations // len(SAMPLE_TEXTS) + 1)
+    with app_module.app.app_context():
+        rules = app_module.rule_registry.current()
+    start = time.perf_counter()
+    for text in texts[:iterations]:
+        app_module.mock_model(text, rules)
+    elapsed = time.perf_counter() - start
+    return {"iterations": iterations, "us_per_call": round(elapsed / iterations * 1e6, 3),
+            "keywords": rules.matcher.keyword_count}
+
+
+def micro_gen_case_no(app_module, iterations: int, threads: int) -> dict:
+    m = app_module
+    result = {}
+    with m.app.app_context():
+        start = time.perf_counter()
+        for _ in range(iterations):
+            m.gen_case_no("x")
+        result["sequential_us_per_call"] = round((time.perf_counter() - start) / iterations * 1e6, 3)
+
+    def worker(n):
+        with m.app.app_context():
+            for _ in range(n):
+                m.gen_case_no("w")
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        list(pool.map(worker, [iterations // threads] * threads))
+    result["threaded_us_per_call"] = round((time.perf_counter() - start) / iterations * 1e6, 3)
+    result["threads"] = threads
+    result["iterations"] = iterations
+    if hasattr(m, "case_allocator"):
+        result["allocator"] = m.case_allocator.stats()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="后端接口压测与微基准")
+    parser.add_argument("--database-url", help="默认使用临时 SQLite 文件；用 MySQL 时请指向一次性的空库")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=200, help="每个场景的请求数")
+    parser.add_argument("--model-latency-ms", type=float, default=20)
+    parser.add_argument("--model-failure-rate", type=float, default=0.0)
+    parser.add_argument("--model-url", help="使用已有的模型服务而不是替身")
+    parser.add_argument("--scenarios", help="逗号分隔，默认全部：" + ",".join(scenarios("user")))
+    parser.add_argument("--data-table", default="user", help="table_data 场景查询的表")
+    parser.add_argument("--seed-users", type=int, default=20)
+    parser.add_argument("--seed-records", type=int, default=2000)
+    parser.add_argument("--seed-reports", type=int, default=500)
+    parser.add_argument("--micro-iterations", type=int, default=2000)
+    parser.add_argument("--out", help="结果 JSON 路径，默认 bench/results/<时间>_<版本>.json")
+    args = parser.parse_args()
+
+    stub = None
+    model_url = args.model_url
+    if not model_url:
+        stub = StubModelServer(latency_ms=args.model_latency_ms, failure_rate=args.model_failure_rate).start()
+        model_url = stub.url
+    tmpdir = tempfile.mkdtemp(prefix="bench_")
+    database_url = args.database_url or f"sqlite:///{os.path.join(tmpdir, 'bench.db')}"
+
+    os.environ.setdefault("SESSION_DB", os.path.join(tmpdir, "sessions.db"))
+    os.environ.setdefault("SECRET_KEY_FILE", os.path.join(tmpdir, "secret_key"))
+    # 跨进程共享的状态文件和归档目录也放进临时目录，不读写 instance/ 下正在使用的文件
+    os.environ.setdefault("HOT_TARGETS_DB", os.path.join(tmpdir, "hot_targets.db"))
+    os.environ.setdefault("EVENTS_DB", os.path.join(tmpdir, "events.db"))
+    os.environ.setdefault("RATE_LIMIT_DB", os.path.join(tmpdir, "ratelimit.db"))
+    os.environ.setdefault("PROFILE_DB", os.path.join(tmpdir, "profiling.db"))
+    os.environ.setdefault("SMS_ARCHIVE_DIR", os.path.join(tmpdir, "archive"))
+    os.environ.setdefault("ADMISSION", "0")     # 压测的是处理能力，默认不经过限流和并发上限（设 ADMISSION=1 可测限流开销）
+    app_module = load_app(database_url, model_url)
+    counter = QueryCounter(app_module)
+    seed(app_module, args.seed_users, args.seed_records, args.seed_reports)
+
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    server = make_server("127.0.0.1", 0, app_module.app, threaded=True)
+    threading.Thread(target=server.serve_forever, name="bench-http", daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_port}"
+
+    all_scenarios = scenarios(args.data_table)
+    selected = args.scenarios.split(",") if args.scenarios else list(all_scenarios)
+    results = {}
+    for name in selected:
+        if name not in all_scenarios:
+            parser.error(f"未知场景: {name}")
+        results[name] = run_scenario(base, name, all_scenarios[name], args.concurrency, args.requests, counter)
+        r = results[name]
+        print(f"{name:20s} rps={r['rps']:>8} p50={r['latency_ms']['p50']}ms p95={r['latency_ms']['p95']}ms "
+              f"p99={r['latency_ms']['p99']}ms errors={r['errors']} queries/req={r['db_queries_per_request']}")
+    server.shutdown()
+
+    micro = {
+        "mock_model": micro_mock_model(app_module, args.micro_iterations),
+        "gen_case_no": micro_gen_case_no(app_module, args.micro_iterations, min(args.concurrency, 8)),
+    }
+    print(f"mock_model           {micro['mock_model']['us_per_call']} us/call")
+    print(f"gen_case_no          {micro['gen_case_no']['sequential_us_per_call']} us/call（单线程）, "
+          f"{micro['gen_case_no']['threaded_us_per_call']} us/call（{micro['gen_case_no']['threads']} 线程）")
+
+    report = {
+        "meta": {
+            "revision": git_revision(),
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "database": database_url.split("://")[0],
+            "model": {"stub": stub is not None, "latency_ms": args.model_latency_ms,
+                      "failure_rate": args.model_failure_rate},
+            "concurrency": args.concurrency,
+            "requests_per_scenario": args.requests,
+            "seed": {"users": args.seed_users, "records": args.seed_records, "reports": args.seed_reports},
+        },
+        "scenarios": results,
+        "micro": micro,
+    }
+    out = args.out or os.path.join(BENCH_DIR, "results",
+                                   f"{datetime.now():%Y%m%d_%H%M%S}_{report['meta']['revision']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"结果已保存：{out}")
+    if stub:
+        stub.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""模型服务替身（压测用）
+
+模拟 MODEL_URL 的两个接口，延迟和失败率可配置：
+- POST /predict        {"text": "..."}     -> {"is_fraud", "fraud_type", "analysis_detail"}
+- POST /predict/batch  {"texts": [...]}    -> {"results": [...]}
+分类结果直接复用关键词规则，保证与 mock_model 的输出格式一致。
+
+单独运行：python bench/stub_model.py --port 8000 --latency-ms 30 --failure-rate 0.05
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fraud_matcher import KeywordMatcher  # noqa: E402
+
+# 与后端 FRAUD_CATEGORIES 的部分类别保持一致即可，替身只需要返回格式正确的结果
+_STUB_RULES = {
+    "刷单返利类": ["刷单", "返利", "点赞", "做任务"],
+    "冒充电商物流客服类": ["客服", "退款", "快递", "包裹丢失"],
+    "贷款、代办信用卡类": ["贷款", "额度", "信用卡"],
+    "冒充公检法及政府机关类": ["公安", "法院", "通缉"],
+}
+_matcher = KeywordMatcher(_STUB_RULES)
+
+
+def classify(text: str) -> dict:
+    hits = _matcher.scan(text)
+    if hits:
+        fraud_type = hits[0]["category"]
+        return {"is_fraud": True, "fraud_type": fraud_type,
+                "analysis_detail": f"模型判断：疑似“{fraud_type}”类型诈骗。"}
+    return {"is_fraud": False, "fraud_type": "正常信息", "analysis_detail": "模型判断：未发现诈骗特征。"}
+
+
+class StubModelServer:
+    def __init__(self, port: int = 0, latency_ms: float = 20, failure_rate: float = 0.0, host: str = "127.0.0.1"):
+        self.latency = latency_ms / 1000.0
+        self.failure_rate = failure_rate
+        self.calls = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status: int, payload: dict):
+                body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                server.calls += 1
+                data = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                time.sleep(server.latency)
+                if random.random() < server.failure_rate:
+                    return self._reply(500, {"error": "stub failure"})
+                if self.path.rstrip("/").endswith("/batch"):
+                    return self._reply(200, {"results": [classify(t) for t in data.get("texts", [])]})
+                return self._reply(200, classify(data.get("text", "")))
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.port = self.httpd.server_address[1]
+        self.url = f"http://{host}:{self.port}/predict"
+
+    def start(self):
+        threading.Thread(target=self.httpd.serve_forever, name="stub-model", daemon=True).start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="模型服务替身")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency-ms", type=float, default=20)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    stub = StubModelServer(args.port, args.latency_ms, args.failure_rate)
+    print(f"模型服务替身已启动：{stub.url}")
+    stub.httpd.serve_forever()
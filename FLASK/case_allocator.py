@@ -0,0 +1,164 @@
+"""号段租用式案件编号发号器
+
+每个类别一次事务从 case_serial 表“租”一段连续编号（默认 100 个），
+之后在内存中逐个发放，用完再租下一段。热门类别不再每条短信都去抢同一行锁。
+
+- 进程间安全：租号段时先 UPDATE 再读取，依赖数据库行锁（SQLite 为库级写锁），
+  不同进程拿到的号段互不重叠。
+- 线程间安全：每个类别一把锁。
+- 进程重启后未发完的号段直接作废（编号会跳号，但不会重复）。
+- 重置：管理员重置计数器时 case_serial.epoch 加 1。每个进程记下号段租用时的 epoch，
+  每次租号时、以及发放时至少每 epoch_check_interval 秒按主键读一次 epoch，
+  发现不一致就丢弃手里的旧号段，不会在计数器从 1 重新开始后继续发放旧编号。
+"""
+import threading
+import time
+
+from sqlalchemy import select, update, insert
+from sqlalchemy.exc import IntegrityError
+
+
+class CaseNoAllocator:
+    def __init__(self, get_engine, table, block_size: int = 100, default_max: int = 99999,
+                 epoch_check_interval: float = 1.0):
+        # get_engine: 返回 SQLAlchemy Engine 的函数（在应用上下文中调用）
+        # table: case_serial 表对象（category / next_val / max_val / epoch）
+        self._get_engine = get_engine
+        self._table = table
+        self.block_size = block_size
+        self.default_max = default_max
+        self.epoch_check_interval = epoch_check_interval
+        self._leases = {}          # 类别 -> [[起始编号, 结束编号(含)], ...]
+        self._epochs = {}          # 类别 -> 手中号段租用时的 epoch
+        self._checked = {}         # 类别 -> 上次核对 epoch 的时间（time.monotonic）
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {"refills": 0, "leased": 0, "issued": 0, "wait_seconds": 0.0, "max_wait_seconds": 0.0,
+                       "epoch_checks": 0, "stale_drops": 0}
+        self.wait_observer = None  # 可选回调：每次发号后传入等待秒数（接入运行指标）
+
+    def _lock_for(self, category: str) -> threading.Lock:
+        with self._locks_guard:
+            lock = self._locks.get(category)
+            if lock is None:
+                lock = self._locks[category] = threading.Lock()
+            return lock
+
+    def allocate(self, category: str, count: int = 1) -> list:
+        """为类别分配 count 个编号，返回 ['a00001', ...]；编号耗尽时抛出 RuntimeError"""
+        start = time.perf_counter()
+        with self._lock_for(category):
+            if self._leases.get(category) and \
+                    time.monotonic() - self._checked.get(category, 0) >= self.epoch_check_interval:
+                self._check_epoch(category)
+            while True:
+                leases = self._leases.setdefault(category, [])
+                available = sum(end - begin + 1 for begin, end in leases)
+                if available >= count:
+                    break
+                self._refill(category, max(self.block_size, count - available))
+            numbers = []
+            while len(numbers) < count:
+                lease = leases[0]
+                take = min(count - len(numbers), lease[1] - lease[0] + 1)
+                numbers.extend(range(lease[0], lease[0] + take))
+                lease[0] += take
+                if lease[0] > lease[1]:
+                    leases.pop(0)
+        waited = time.perf_counter() - start
+        with self._stats_lock:
+            self._stats["issued"] += count
+            self._stats["wait_seconds"] += waited
+            self._stats["max_wait_seconds"] = max(self._stats["max_wait_seconds"], waited)
+        if self.wait_observer is not None:
+            self.wait_observer(waited)
+        return [f"{category}{n:05d}" for n in numbers]  # 格式化为类别字母+五位数字
+
+    def _drop_stale(self, category: str, epoch: int):
+        # 调用方已持有该类别的锁：计数器已被重置，手中的旧号段作废
+        if self._epochs.get(category) != epoch:
+            if self._leases.get(category):
+                with self._stats_lock:
+                    self._stats["stale_drops"] += 1
+            self._leases[category] = []
+            self._epochs[category] = epoch
+        self._checked[category] = time.monotonic()
+
+    def _check_epoch(self, category: str):
+        """按主键读一次 epoch（调用方已持有该类别的锁）"""
+        t = self._table
+        with self._get_engine().connect() as conn:
+            epoch = conn.execute(select(t.c.epoch).where(t.c.category == category)).scalar()
+        with self._stats_lock:
+            self._stats["epoch_checks"] += 1
+        self._drop_stale(category, epoch or 0)
+
+    def _refill(self, category: str, want: int) -> int:
+        """在独立事务中租一段编号，返回实际租到的个数（调用方已持有该类别的锁）"""
+        t = self._table
+        for _ in range(2):
+            try:
+                with self._get_engine().begin() as conn:
+                    # 先 UPDATE 拿到行锁，再读回新值，避免两个进程读到同一个 next_val
+                    moved = conn.execute(
+                        update(t)
+                        .where(t.c.category == category, t.c.next_val <= t.c.max_val)
+                        .values(next_val=t.c.next_val + want)
+                    ).rowcount
+                    if not moved:
+                        row = conn.execute(select(t.c.next_val).where(t.c.category == category)).fetchone()
+                        if row is not None:
+                            raise RuntimeError(f"类别 {category} 的编号已耗尽")
+                        # 如果类别不存在，则初始化该类别，本次租用的号段直接占用
+                        granted = min(want, self.default_max)
+                        conn.execute(insert(t).values(category=category, next_val=granted + 1,
+                                                      max_val=self.default_max, epoch=0))
+                        begin, epoch = 1, 0
+                    else:
+                        next_val, max_val, epoch = conn.execute(
+                            select(t.c.next_val, t.c.max_val, t.c.epoch).where(t.c.category == category)
+                        ).fetchone()
+                        begin = next_val - want
+                        granted = min(want, max_val - begin + 1)
+                        if granted < want:
+                            # 号段跨过上限：只租到上限为止
+                            conn.execute(update(t).where(t.c.category == category)
+                                         .values(next_val=begin + granted))
+                break
+            except IntegrityError:
+                # 并发初始化同一类别，另一方已插入，重试走 UPDATE 分支
+                continue
+        else:
+            raise RuntimeError(f"类别 {category} 的号段租用失败")
+        # 与新号段同一事务读到的 epoch 变了，说明手里剩下的是重置前的旧号段
+        self._drop_stale(category, epoch or 0)
+        self._leases[category].append([begin, begin + granted - 1])
+        with self._stats_lock:
+            self._stats["refills"] += 1
+            self._stats["leased"] += granted
+        return granted
+
+    def reset(self, category: str = None):
+        """立即丢弃本进程中尚未发放的号段（计数器被管理员重置后调用）
+
+        其他进程在下次租号或下次核对 epoch 时（不超过 epoch_check_interval 秒）丢弃各自的旧号段。
+        """
+        with self._locks_guard:
+            categories = [category] if category else list(self._leases)
+        for c in categories:
+            with self._lock_for(c):
+                self._leases.pop(c, None)
+
+    def stats(self) -> dict:
+        """租号次数、发放数量、等待耗时，以及各类别内存中剩余的编号数"""
+        with self._stats_lock:
+            data = dict(self._stats)
+        data["avg_wait_ms"] = round(data["wait_seconds"] / data["issued"] * 1000, 3) if data["issued"] else 0
+        data["max_wait_ms"] = round(data.pop("max_wait_seconds") * 1000, 3)
+        data["wait_seconds"] = round(data["wait_seconds"], 6)
+        data["block_size"] = self.block_size
+        data["epoch_check_interval"] = self.epoch_check_interval
+        data["epochs"] = dict(self._epochs)
+        data["remaining"] = {c: sum(e - b + 1 for b, e in leases) for c, leases in list(self._leases.items())}
+        return data
@@ -0,0 +1,307 @@
+"""管理后台事件推送（/admin/events，Server-Sent Events）
+
+管理页面不再轮询统计和列表接口，而是保持一个 SSE 连接，由服务端推送变化：
+- 发布：stage(session, 类型, 数据) 把事件挂在数据库会话上，事务提交后才发布，回滚则丢弃，
+  推送出去的变化一定已经落库；publish() 直接发布；
+- 分发：每个工作进程一个发布者，向本进程的每个连接分发；每个连接一个有界缓冲区（buffer_size 个事件），
+  连续的统计增量（stats，如清理任务逐块产生的）在缓冲区中合并为一条，
+  缓冲区满时丢弃该连接（推送 overflow 后关闭），
+  慢客户端不会拖慢发布者，也不会无限占用内存；
+- 续传：事件 id 单调递增，最近 history 个事件保留在内存中，客户端重连时带上 Last-Event-ID
+  即可补收断开期间的事件（重连到的进程还没轮询到这个 id 时先补读一次共享文件）；
+  超出保留范围时推送 reset，客户端重新拉取列表；
+- 多进程：open(path) 后事件先写入共享 SQLite 文件（各进程的发布每 poll_interval 秒合并写入一次），
+  各进程再从文件中按 id 读取新事件分发给本进程的连接，任一进程发布的事件所有连接都能收到；
+  事件 id 取自文件的自增主键，文件中保留 retention 秒内的事件。
+"""
+import atexit
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter, deque
+
+STATS = "stats"
+_PENDING = "pending_events"
+
+
+def merge_stats(into: dict, delta: dict):
+    """合并两条 stats 事件的数据：{"deltas": [{"day", "fraud_type", "is_fraud", "count"}]}"""
+    counts = Counter()
+    for item in into.get("deltas", []) + delta.get("deltas", []):
+        counts[(item["day"], item["fraud_type"], item["is_fraud"])] += item["count"]
+    into["deltas"] = [{"day": d, "fraud_type": t, "is_fraud": f, "count": n}
+                      for (d, t, f), n in sorted(counts.items()) if n]
+
+
+class Subscriber:
+    def __init__(self, buffer_size: int):
+        self.buffer_size = buffer_size
+        self.queue = deque()
+        self.overflowed = False
+        self.stats_entry = None     # 最近放入缓冲区、尚未发出的 stats 事件
+        self.cond = threading.Condition()
+
+    def offer(self, event: dict) -> str:
+        """放入一个事件，返回 "delivered" / "coalesced"；缓冲区已满返回 None（调用方随后丢弃这个连接）"""
+        with self.cond:
+            if self.overflowed:
+                return None
+            # 只有缓冲区末尾的 stats 才合并：合并后的 id 仍然连续递增，续传时不会重复或漏掉增量
+            if event["type"] == STATS and self.queue and self.queue[-1] is self.stats_entry:
+                self.stats_entry["id"] = event["id"]
+                merge_stats(self.stats_entry["data"], event["data"])
+                return "coalesced"
+            if len(self.queue) >= self.buffer_size:
+                self.overflowed = True
+                self.queue.clear()
+                self.stats_entry = None
+                self.cond.notify()
+                return None
+            if event["type"] == STATS:
+                # 复制一份，后续合并不影响其他连接和历史中的同一事件
+                event = self.stats_entry = {"id": event["id"], "type": STATS, "data": dict(event["data"])}
+            self.queue.append(event)
+            self.cond.notify()
+            return "delivered"
+
+    def take(self, timeout: float) -> list:
+        """取出缓冲区中的全部事件，没有事件时最多等待 timeout 秒"""
+        with self.cond:
+            if not self.queue and not self.overflowed:
+                self.cond.wait(timeout)
+            events = list(self.queue)
+            self.queue.clear()
+            self.stats_entry = None
+            return events
+
+
+class EventBus:
+    def __init__(self, buffer_size: int = 256, history: int = 1000, max_clients: int = 8,
+                 poll_interval: float = 0.5, retention: float = 300):
+        self.buffer_size = buffer_size
+        self.history = history
+        self.max_clients = max_clients
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self.path = None
+        self._recent = deque(maxlen=history)   # 最近的事件，用于 Last-Event-ID 续传
+        self._last_id = 0                      # 本进程已分发的最大事件 id
+        self._init_state()
+        os.register_at_fork(after_in_child=self._init_state)
+
+    def _init_state(self):
+        # 子进程沿用已分发的位置，不继承父进程的连接、线程和待写事件
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._outbox = []           # 共享模式下尚未写入文件的事件
+        self._poll_lock = threading.Lock()   # 后台线程和重连补读不同时读取文件，避免重复分发
+        self._thread = None
+        self._stats = {"published": 0, "delivered": 0, "coalesced": 0, "dropped_clients": 0,
+                       "rejected_clients": 0, "poll_errors": 0}
+
+    def open(self, path: str):
+        """启用跨进程共享：事件经 path 指向的 SQLite 文件在各工作进程间分发"""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        with self._connect() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS event_log ("
+                         "id INTEGER PRIMARY KEY AUTOINCREMENT, type TEXT NOT NULL, data TEXT NOT NULL, "
+                         "created REAL NOT NULL)")
+            self._last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM event_log").fetchone()[0]
+        atexit.register(self._flush_outbox)
+        return self
+
+    # ---------------- 发布 ----------------
+    def stage(self, session, event_type: str, data: dict):
+        """事件挂在会话上，事务提交后发布（需先 attach 该会话）"""
+        session.info.setdefault(_PENDING, []).append((event_type, data))
+
+    def attach(self, session):
+        """在会话（或 scoped_session）上注册提交/回滚钩子"""
+        from sqlalchemy import event
+
+        def after_commit(sess):
+            for event_type, data in sess.info.pop(_PENDING, ()):
+                self.publish(event_type, data)
+
+        def after_soft_rollback(sess, previous_transaction):
+            if not sess.in_transaction():
+                sess.info.pop(_PENDING, None)
+
+        event.listen(session, "after_commit", after_commit)
+        event.listen(session, "after_soft_rollback", after_soft_rollback)
+
+    def publish(self, event_type: str, data: dict):
+        if self.path:
+            with self._lock:
+                self._outbox.append((event_type, json.dumps(data, ensure_ascii=False), time.time()))
+                self._stats["published"] += 1
+            self._ensure_thread()
+            return
+        with self._lock:
+            self._last_id += 1
+            event = {"id": self._last_id, "type": event_type, "data": data}
+            self._recent.append(event)
+            self._stats["published"] += 1
+            self._dispatch([event])
+
+    def _dispatch(self, events):
+        # 调用方持有 self._lock
+        for sub in list(self._subscribers):
+            for event in events:
+                outcome = sub.offer(event)
+                if outcome is None:
+                    self._subscribers.discard(sub)
+                    self._stats["dropped_clients"] += 1
+                    break
+                self._stats[outcome] += 1
+
+    # ---------------- 订阅 ----------------
+    def subscribe(self, last_event_id: int = None):
+        """登记一个连接，返回 (Subscriber, 是否需要客户端重新拉取)；连接数已满时返回 (None, False)"""
+        if self.path and last_event_id is not None and last_event_id > self._last_id:
+            # 断开前连接的可能是别的进程，它已分发的事件本进程还没轮询到：先补读一次文件，再判断能否续传
+            self._catch_up()
+        with self._lock:
+            if len(self._subscribers) >= self.max_clients:
+                self._stats["rejected_clients"] += 1
+                return None, False
+            sub = Subscriber(self.buffer_size)
+            reset = False
+            if last_event_id is not None and last_event_id != self._last_id:
+                missed = self._missed(last_event_id)
+                # 接不上断开的位置（中间的事件已过保留期，或 id 来自重启前的进程）时，客户端需要重新拉取
+                if not missed or missed[0]["id"] != last_event_id + 1:
+                    reset = True
+                else:
+                    for event in missed:
+                        if sub.offer(event) is None:
+                            sub, reset = Subscriber(self.buffer_size), True
+                            break
+            self._subscribers.add(sub)
+        if self.path:
+            self._ensure_thread()
+        return sub, reset
+
+    def _missed(self, last_event_id: int) -> list:
+        # 调用方持有 self._lock；共享模式下从文件补读（断开前连接的可能是别的进程）
+        if last_event_id > self._last_id:
+            return []
+        if self.path:
+            conn = self._connect()
+            try:
+                rows = conn.execute("SELECT id, type, data FROM event_log WHERE id > ? AND id <= ? ORDER BY id",
+                                    (last_event_id, self._last_id)).fetchall()
+            finally:
+                conn.close()
+            return [{"id": i, "type": t, "data": json.loads(d)} for i, t, d in rows]
+        return [e for e in self._recent if e["id"] > last_event_id]
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            self._subscribers.discard(sub)
+
+    def stream(self, sub, reset: bool = False, heartbeat: float = 15, lifetime: float = 300, retry_ms: int = 3000):
+        """生成 SSE 文本；lifetime 秒后结束，客户端带 Last-Event-ID 自动重连（工作线程得以轮换）"""
+        try:
+            yield f"retry: {retry_ms}\n\n"
+            if reset:
+                yield self.format({"id": self._last_id, "type": "reset", "data": {}})
+            deadline = time.monotonic() + lifetime
+            while time.monotonic() < deadline:
+                events = sub.take(min(heartbeat, max(deadline - time.monotonic(), 0)))
+                if sub.overflowed:
+                    yield self.format({"id": None, "type": "overflow", "data": {"msg": "推送积压，请重新拉取数据"}})
+                    return
+                if not events:
+                    yield ": ping\n\n"      # 心跳：防止代理断开空闲连接，也能及时发现已断开的客户端
+                    continue
+                yield "".join(self.format(e) for e in events)
+        finally:
+            self.unsubscribe(sub)
+
+    @staticmethod
+    def format(event: dict) -> str:
+        head = f"id: {event['id']}\n" if event["id"] is not None else ""
+        return f"{head}event: {event['type']}\ndata: {json.dumps(event['data'], ensure_ascii=False)}\n\n"
+
+    # ---------------- 跨进程共享 ----------------
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _ensure_thread(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="event-bus", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        conn = self._connect()
+        last_trim = 0
+        while True:
+            time.sleep(self.poll_interval)
+            try:
+                self._flush_outbox(conn)
+                self._poll(conn)
+                if time.time() - last_trim > self.retention / 10:
+                    conn.execute("DELETE FROM event_log WHERE created < ?", (time.time() - self.retention,))
+                    last_trim = time.time()
+            except sqlite3.Error as e:
+                self._stats["poll_errors"] += 1
+                print("事件共享文件读写失败:", e)
+
+    def _flush_outbox(self, conn=None):
+        with self._lock:
+            pending, self._outbox = self._outbox, []
+        if not pending or not self.path:
+            return
+        own = conn is None
+        conn = conn or self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany("INSERT INTO event_log (type, data, created) VALUES (?, ?, ?)", pending)
+            conn.execute("COMMIT")
+        except sqlite3.Error:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            with self._lock:
+                self._outbox[:0] = pending      # 下次再写
+            raise
+        finally:
+            if own:
+                conn.close()
+
+    def _poll(self, conn):
+        with self._poll_lock:
+            rows = conn.execute("SELECT id, type, data FROM event_log WHERE id > ? ORDER BY id",
+                                (self._last_id,)).fetchall()
+            if not rows:
+                return
+            events = [{"id": i, "type": t, "data": json.loads(d)} for i, t, d in rows]
+            with self._lock:
+                self._last_id = events[-1]["id"]
+                self._recent.extend(events)
+                self._dispatch(events)
+
+    def _catch_up(self):
+        try:
+            conn = self._connect()
+            try:
+                self._poll(conn)
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            self._stats["poll_errors"] += 1
+            print("事件共享文件读取失败:", e)
+
+    def stats(self) -> dict:
+        with self._lock:
+            data = dict(self._stats, clients=len(self._subscribers), last_id=self._last_id,
+                        outbox=len(self._outbox))
+        data.update(buffer_size=self.buffer_size, max_clients=self.max_clients, shared=self.path)
+        return data
@@ -0,0 +1,133 @@
+"""多模式关键词匹配器（Aho-Corasick 自动机）
+
+启动时把所有诈骗类别关键词和自定义词库编译成一个自动机，
+之后每条短信只需从头到尾扫描一遍，就能找出全部关键词命中，
+耗时只和文本长度、命中数有关，与关键词数量无关。
+"""
+import hashlib
+import json
+import os
+from collections import deque
+
+# 自定义词库（诈骗相关的平台/APP名称），与后端目录同级
+LEXICON_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "大创文本识别")
+USERWORDS_PATH = os.path.join(LEXICON_DIR, "userwords.txt")
+
+# 词库命中在结果中使用的标签（不属于任何诈骗类别）
+LEXICON_LABEL = "涉诈平台词库"
+
+
+def load_wordlist(path: str) -> list:
+    """按行读取词表，忽略空行；文件不存在时返回空列表"""
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def _fold(ch: str) -> str:
+    """大小写归一（只处理一对一的字符，保证命中位置与原文一致）"""
+    low = ch.lower()
+    return low if len(low) == 1 else ch
+
+
+def fold_text(text: str) -> str:
+    """匹配器实际看到的文本：逐字做大小写归一，其余字符（空白、标点、数字）原样保留"""
+    return "".join(_fold(ch) for ch in text)
+
+
+class KeywordMatcher:
+    """Aho-Corasick 自动机：一次扫描找出所有标签下的全部关键词命中"""
+
+    def __init__(self, labelled_keywords: dict):
+        # labelled_keywords: {标签: [关键词, ...]}，标签的先后顺序即并列时的优先级
+        self.labels = list(labelled_keywords)
+        # 规则指纹：关键词或标签顺序（并列时的优先级）有任何变化都会改变，用作结果缓存的版本号
+        self.fingerprint = hashlib.sha1(
+            json.dumps([[label, list(kws)] for label, kws in labelled_keywords.items()],
+                       ensure_ascii=False).encode("utf-8")
+        ).hexdigest()[:12]
+        self._rank = {label: i for i, label in enumerate(self.labels)}
+        self._goto = [{}]     # 每个状态的转移表
+        self._fail = [0]      # 失配指针
+        self._out = [()]      # 每个状态可输出的 (标签, 关键词)，已合并失配链上的输出
+        self.keyword_count = 0
+        for label, keywords in labelled_keywords.items():
+            for kw in keywords:
+                if kw and self._add(kw, label):
+                    self.keyword_count += 1
+        self._build()
+
+    def _add(self, keyword: str, label: str):
+        state = 0
+        for ch in keyword:
+            ch = _fold(ch)
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(())
+            state = nxt
+        if (label, keyword) in self._out[state]:
+            return False
+        self._out[state] = self._out[state] + ((label, keyword),)
+        return True
+
+    def _build(self):
+        """广度优先计算失配指针，并把失配链上的输出合并到当前状态"""
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                f = self._fail[state]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                target = self._goto[f].get(ch, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                if self._out[self._fail[nxt]]:
+                    self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def iter_matches(self, text: str):
+        """逐个产出命中：(起始位置, 标签, 关键词)"""
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        for i, ch in enumerate(text):
+            ch = _fold(ch)
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if out[state]:
+                for label, kw in out[state]:
+                    yield i - len(kw) + 1, label, kw
+
+    def scan(self, text: str) -> list:
+        """返回按命中数排序的多标签结果
+
+        每项为 {"category", "hits", "keywords", "positions"}，
+        命中数相同则先出现者优先，再按标签定义顺序。
+        """
+        found = {}
+        for pos, label, kw in self.iter_matches(text):
+            item = found.get(label)
+            if item is None:
+                item = found[label] = {"category": label, "hits": 0, "keywords": [], "positions": []}
+            item["hits"] += 1
+            item["positions"].append(pos)
+            if kw not in item["keywords"]:
+                item["keywords"].append(kw)
+        return sorted(
+            found.values(),
+            key=lambda x: (-x["hits"], min(x["positions"]), self._rank[x["category"]])
+        )
+
+
+def build_matcher(categories: dict, lexicon_path: str = USERWORDS_PATH) -> KeywordMatcher:
+    """用诈骗类别关键词和自定义词库编译匹配器"""
+    labelled = dict(categories)
+    lexicon = load_wordlist(lexicon_path)
+    if lexicon:
+        labelled[LEXICON_LABEL] = lexicon
+    return KeywordMatcher(labelled)
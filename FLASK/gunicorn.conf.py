@@ -0,0 +1,23 @@
+"""gunicorn 配置：gunicorn -c gunicorn.conf.py wsgi:app
+
+各项均可用环境变量覆盖。多个工作进程共用 SECRET_KEY（或 instance/secret_key 文件）
+和 SESSION_DB 会话库，登录状态在进程间通用。
+"""
+import multiprocessing
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:5000")
+# CPU 密集的规则匹配受 GIL 限制，用多进程扩展到多核；每个进程再开多个线程等待数据库和模型服务
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "gthread"
+threads = int(os.getenv("WEB_THREADS", "8"))
+# 不预加载：每个工作进程各自导入应用，数据库连接池、模型服务连接和后台线程都在子进程中创建
+preload_app = os.getenv("GUNICORN_PRELOAD", "0") == "1"
+timeout = int(os.getenv("WEB_TIMEOUT", "60"))
+graceful_timeout = 30
+keepalive = 5
+# 定期重启工作进程，防止内存缓慢增长
+max_requests = int(os.getenv("WEB_MAX_REQUESTS", "10000"))
+max_requests_jitter = 1000
+accesslog = os.getenv("ACCESS_LOG", "-")
+errorlog = "-"
@@ -0,0 +1,212 @@
+"""高频举报对象排行（Count-Min Sketch + Top-K）
+
+统计“最近一小时 / 一天被举报最多的电话、网址、APP”，内存占用固定，与举报量和对象个数无关：
+- 时间按桶切分：小时窗口为 12 个 5 分钟桶，天窗口为 24 个 1 小时桶，过期的桶直接丢弃；
+- 每个桶一个 Count-Min Sketch（depth 行 * width 列的计数器），估计值只会偏大，
+  偏大量不超过窗口内总举报数的 e / width（默认约 0.13%）；
+- 每个桶另外保留估计值最大的 capacity 个候选对象，查询时合并窗口内各桶的 sketch 和候选，
+  按合并后的估计值排序取前 k 个。
+设置 path 后各工作进程把增量定期（flush_interval 秒）合并到同一个 SQLite 文件，排行为全部进程的汇总；
+不设置时只统计本进程。
+"""
+import atexit
+import hashlib
+import heapq
+import json
+import os
+import sqlite3
+import threading
+import time
+from array import array
+
+WINDOWS = {"hour": (300, 12), "day": (3600, 24)}   # 窗口名 -> (桶长秒数, 桶数)
+
+
+class CountMinSketch:
+    def __init__(self, width: int = 2048, depth: int = 4, counts: array = None):
+        if depth > 4 or width > 1 << 16:
+            raise ValueError("depth 最大 4，width 最大 65536")
+        self.width = width
+        self.depth = depth
+        self.counts = counts if counts is not None else array("I", bytes(4 * width * depth))
+
+    def _cells(self, key: str):
+        # 一次 64 位哈希切成 depth 段，每段 16 位对应一行的列号
+        h = int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "little")
+        return [row * self.width + ((h >> (16 * row)) & 0xFFFF) % self.width for row in range(self.depth)]
+
+    def add(self, key: str, n: int = 1) -> int:
+        """计数并返回新的估计值"""
+        cells = self._cells(key)
+        for cell in cells:
+            self.counts[cell] += n
+        return min(self.counts[cell] for cell in cells)
+
+    def estimate(self, key: str) -> int:
+        return min(self.counts[cell] for cell in self._cells(key))
+
+    def merge(self, other: "CountMinSketch"):
+        self.counts = array("I", map(sum, zip(self.counts, other.counts)))
+
+    def to_bytes(self) -> bytes:
+        return self.counts.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data: bytes, width: int, depth: int) -> "CountMinSketch":
+        counts = array("I")
+        counts.frombytes(data)
+        return cls(width, depth, counts)
+
+
+class _Bucket:
+    __slots__ = ("sketch", "candidates")
+
+    def __init__(self, sketch, candidates=None):
+        self.sketch = sketch
+        self.candidates = candidates or {}    # 对象 -> 估计值
+
+
+class HotTargets:
+    def __init__(self, width: int = 2048, depth: int = 4, capacity: int = 200, flush_interval: float = 5.0):
+        self.width = width
+        self.depth = depth
+        self.capacity = capacity
+        self.flush_interval = flush_interval
+        self.path = None
+        self._buckets = {}          # (窗口名, 桶起始时间) -> _Bucket；共享模式下为尚未合并的增量
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._last_flush = time.time()
+        self._stats = {"added": 0, "flushes": 0, "flush_errors": 0}
+
+    def open(self, path: str):
+        """启用跨进程共享：增量定期合并到 path 指向的 SQLite 文件"""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        with self._connect() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS hot_target_bucket ("
+                         "win TEXT NOT NULL, bucket INTEGER NOT NULL, sketch BLOB NOT NULL, "
+                         "candidates TEXT NOT NULL, PRIMARY KEY (win, bucket))")
+        atexit.register(self.flush)
+        return self
+
+    # ---------------- 计数 ----------------
+    def add(self, targets, n: int = 1, now: float = None):
+        now = now or time.time()
+        with self._lock:
+            for window, (span, count) in WINDOWS.items():
+                start = int(now // span * span)
+                bucket = self._buckets.get((window, start))
+                if bucket is None:
+                    bucket = self._buckets[(window, start)] = _Bucket(CountMinSketch(self.width, self.depth))
+                    self._expire(now)
+                for target in targets:
+                    bucket.candidates[target] = bucket.sketch.add(target, n)
+                self._prune(bucket)
+            self._stats["added"] += len(targets) * n
+        if self.path and now - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def _prune(self, bucket):
+        # 候选数超过 2 倍容量时只保留估计值最大的 capacity 个，摊还后每次计数 O(1)
+        if len(bucket.candidates) > 2 * self.capacity:
+            bucket.candidates = dict(heapq.nlargest(self.capacity, bucket.candidates.items(), key=lambda x: x[1]))
+
+    def _expire(self, now):
+        for window, start in list(self._buckets):
+            span, count = WINDOWS[window]
+            if start <= now - span * count:
+                del self._buckets[(window, start)]
+
+    # ---------------- 查询 ----------------
+    def top(self, window: str = "hour", k: int = 20, now: float = None) -> list:
+        """窗口内被举报最多的 k 个对象：[{"target", "count"}]，count 为估计值（只会偏大）"""
+        span, count = WINDOWS[window]
+        now = now or time.time()
+        oldest = int(now // span * span) - span * (count - 1)
+        if self.path:
+            self.flush()
+            with self._connect() as conn:
+                rows = conn.execute("SELECT sketch, candidates FROM hot_target_bucket WHERE win = ? AND bucket >= ?",
+                                    (window, oldest)).fetchall()
+            buckets = [_Bucket(CountMinSketch.from_bytes(s, self.width, self.depth), json.loads(c)) for s, c in rows]
+        else:
+            with self._lock:
+                buckets = [_Bucket(CountMinSketch(self.width, self.depth, array("I", b.sketch.counts)),
+                                   dict(b.candidates))
+                           for (w, start), b in self._buckets.items() if w == window and start >= oldest]
+        if not buckets:
+            return []
+        merged = buckets[0].sketch
+        candidates = set(buckets[0].candidates)
+        for b in buckets[1:]:
+            merged.merge(b.sketch)
+            candidates.update(b.candidates)
+        ranked = heapq.nlargest(k, ((merged.estimate(t), t) for t in candidates))
+        return [{"target": t, "count": n} for n, t in ranked]
+
+    # ---------------- 跨进程共享 ----------------
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = self._local.conn = self._connect()
+            self._local.pid = os.getpid()
+        return conn
+
+    def flush(self):
+        """把本进程的增量合并进共享文件"""
+        if not self.path:
+            return
+        with self._lock:
+            pending, self._buckets = self._buckets, {}
+            self._last_flush = time.time()
+        if not pending:
+            return
+        now = time.time()
+        conn = self._conn()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for (window, start), delta in pending.items():
+                row = conn.execute("SELECT sketch, candidates FROM hot_target_bucket WHERE win = ? AND bucket = ?",
+                                   (window, start)).fetchone()
+                # 合并到副本上：事务失败时放回的仍是原始增量，不会把共享文件中的计数重复累加
+                merged = CountMinSketch(self.width, self.depth, array("I", delta.sketch.counts))
+                if row is not None:
+                    merged.merge(CountMinSketch.from_bytes(row[0], self.width, self.depth))
+                    names = set(json.loads(row[1])) | set(delta.candidates)
+                else:
+                    names = set(delta.candidates)
+                candidates = dict(heapq.nlargest(
+                    self.capacity, ((t, merged.estimate(t)) for t in names), key=lambda x: x[1]))
+                conn.execute("INSERT OR REPLACE INTO hot_target_bucket (win, bucket, sketch, candidates) "
+                             "VALUES (?, ?, ?, ?)",
+                             (window, start, merged.to_bytes(), json.dumps(candidates, ensure_ascii=False)))
+            for window, (span, count) in WINDOWS.items():
+                conn.execute("DELETE FROM hot_target_bucket WHERE win = ? AND bucket <= ?",
+                             (window, now - span * count))
+            conn.execute("COMMIT")
+            self._stats["flushes"] += 1
+        except Exception as e:
+            conn.execute("ROLLBACK") if conn.in_transaction else None
+            self._stats["flush_errors"] += 1
+            print("举报排行合并失败，增量保留到下次合并:", e)
+            with self._lock:
+                for key, delta in pending.items():
+                    current = self._buckets.get(key)
+                    if current is None:
+                        self._buckets[key] = delta
+                    else:
+                        current.sketch.merge(delta.sketch)
+                        current.candidates.update(delta.candidates)
+
+    def stats(self) -> dict:
+        with self._lock:
+            data = dict(self._stats, buckets=len(self._buckets))
+        data.update(width=self.width, depth=self.depth, capacity=self.capacity, shared=self.path,
+                    memory_bytes=data["buckets"] * self.width * self.depth * 4)
+        return data
@@ -0,0 +1,57 @@
+"""登录用户身份缓存
+
+登录时 session 中记下 user_id，之后的请求按 user_id 从进程内缓存取 {id, username, role}，
+不必每个请求都按用户名查一次 user 表。缓存条目 ttl 秒后过期重新加载：
+- 本进程删除用户时立即作废对应条目；
+- 其他工作进程最迟 ttl 秒后重新加载，发现用户已删除（或正在被删除）即拒绝。
+不存在的用户也会缓存（值为 None），被删除用户的旧会话反复请求不会每次都查库。
+"""
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class IdentityCache:
+    def __init__(self, loader, ttl: float = 30.0, max_entries: int = 10000):
+        # loader(user_id) -> {id, username, role} 或 None（用户不存在或已被删除）
+        self._loader = loader
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._data = OrderedDict()      # user_id -> (身份或 None, 过期时间)
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    def get(self, user_id):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(user_id, _MISSING)
+            if entry is not _MISSING and entry[1] > now:
+                self._data.move_to_end(user_id)
+                self._stats["hits"] += 1
+                return entry[0]
+            self._stats["misses"] += 1
+        identity = self._loader(user_id)
+        with self._lock:
+            self._data[user_id] = (identity, now + self.ttl)
+            self._data.move_to_end(user_id)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+        return identity
+
+    def invalidate(self, user_id=None):
+        """作废某个用户（或全部）的缓存，下次访问重新加载"""
+        with self._lock:
+            if user_id is None:
+                self._data.clear()
+            else:
+                self._data.pop(user_id, None)
+            self._stats["invalidations"] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            data = dict(self._stats, entries=len(self._data), ttl=self.ttl)
+        lookups = data["hits"] + data["misses"]
+        data["hit_ratio"] = round(data["hits"] / lookups, 4) if lookups else 0
+        return data
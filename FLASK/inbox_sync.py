@@ -0,0 +1,88 @@
+"""收件箱增量同步
+
+客户端不再上传整箱短信，而是先上传每条短信的哈希（SHA-256 取前 128 位，32 个十六进制字符）：
+- 服务端按 sms_record.text_hash 查出该用户在当前规则版本下已经分析过的短信，返回结论和案件编号，
+  并列出没有命中的哈希（其他用户的记录不会命中，也不会返回其他用户的案件编号）；
+- 客户端只上传这些没命中的短信，服务端分析后逐批流式返回结果；
+- 哈希集合的摘要（对排好序的哈希再做一次哈希）记在 sms_sync_state 中，
+  客户端下次只带摘要来问“有没有变化”，收件箱和生效规则都没变时只需按主键读一行。
+
+哈希与前端 utils/inbox-sync.js 中的实现逐位一致：内容按 UTF-8 编码（孤立的代理项按 U+FFFD 编码）后计算 SHA-256。
+"""
+import hashlib
+from datetime import datetime
+
+from sqlalchemy import insert, select, update
+
+HASH_LEN = 32
+
+
+def _utf8(text: str) -> bytes:
+    try:
+        return text.encode("utf-8")
+    except UnicodeEncodeError:
+        # 孤立的代理项（JSON 中可以出现 "\ud800"）换成 U+FFFD，与浏览器 TextEncoder 的做法相同
+        return text.encode("utf-16-le", "surrogatepass").decode("utf-16-le", "replace").encode("utf-8")
+
+
+def text_hash(text: str) -> str:
+    """短信内容的哈希（32 位十六进制），与前端 hashText 相同"""
+    return hashlib.sha256(_utf8(text)).hexdigest()[:HASH_LEN]
+
+
+def digest(hashes) -> str:
+    """哈希集合的摘要：排序去重后用逗号连接再哈希一次"""
+    return text_hash(",".join(sorted(set(hashes))))
+
+
+def parse_hashes(packed) -> list:
+    """解析客户端上传的哈希：32 位一段首尾相连的字符串（也接受列表），格式不对时抛出 ValueError"""
+    if isinstance(packed, list):
+        packed = "".join(h for h in packed if isinstance(h, str))
+    if not isinstance(packed, str) or len(packed) % HASH_LEN:
+        raise ValueError("hashes 格式不正确")
+    packed = packed.lower()
+    try:
+        int(packed or "0", 16)
+    except ValueError:
+        raise ValueError("hashes 格式不正确")
+    return [packed[i:i + HASH_LEN] for i in range(0, len(packed), HASH_LEN)]
+
+
+class InboxSync:
+    def __init__(self, get_engine, record_table, state_table, chunk_size: int = 500):
+        # record_table: sms_record 表；state_table: sms_sync_state 表；get_engine: 返回 Engine 的函数
+        self._get_engine = get_engine
+        self.records = record_table
+        self.state = state_table
+        self.chunk_size = chunk_size
+
+    def unchanged(self, user_id: int, inbox_digest: str, rule_version: int) -> bool:
+        s = self.state
+        with self._get_engine().connect() as conn:
+            row = conn.execute(select(s.c.digest, s.c.rule_version).where(s.c.user_id == user_id)).first()
+        return row is not None and row.digest == inbox_digest and row.rule_version == rule_version
+
+    def remember(self, user_id: int, inbox_digest: str, rule_version: int):
+        s = self.state
+        values = {"digest": inbox_digest, "rule_version": rule_version, "updated_at": datetime.now()}
+        with self._get_engine().begin() as conn:
+            if not conn.execute(update(s).where(s.c.user_id == user_id).values(**values)).rowcount:
+                conn.execute(insert(s).values(user_id=user_id, **values))
+
+    def known(self, hashes, user_id: int, rule_version: int) -> dict:
+        """{哈希: 该用户在当前规则版本下最近一次分析的记录}，按块查询 text_hash 索引"""
+        t = self.records
+        found = {}
+        wanted = sorted(set(hashes))
+        with self._get_engine().connect() as conn:
+            for i in range(0, len(wanted), self.chunk_size):
+                rows = conn.execute(
+                    select(t.c.text_hash, t.c.case_no, t.c.is_fraud, t.c.fraud_type, t.c.detail)
+                    .where(t.c.text_hash.in_(wanted[i:i + self.chunk_size]), t.c.user_id == user_id,
+                           t.c.rule_version == rule_version)
+                    .order_by(t.c.id)
+                ).fetchall()
+                for row in rows:
+                    found[row.text_hash] = row      # 按 id 升序，后面的覆盖前面的
+        return found
@@ -0,0 +1,413 @@
+"""运行指标（Prometheus 文本格式）与按需性能剖析
+
+- Counter / Gauge / Histogram：带标签的进程内指标，Registry.render() 输出 Prometheus 0.0.4 文本格式；
+  Gauge 可以传入回调，在抓取时才读取（连接池、熔断器、缓存等现成的状态）。
+- AppMetrics.init_app：给 Flask 应用挂上按路由统计的延迟直方图、请求/错误计数，
+  按请求统计的 SQL 条数和耗时，以及连接池取连接的等待时间和池状态。
+- RequestProfiler：按采样率（或管理员请求头 X-Profile: 1）对单个请求运行 cProfile，
+  超过慢请求阈值的结果保留在内存中供查看，线上可随时打开、关闭，无需重新部署；
+  open(path) 后开关和阈值存放在共享 SQLite 文件中，各工作进程每 poll_interval 秒读一次，
+  一次修改对所有进程生效（剖析结果仍保存在各自进程内）。
+
+指标保存在各工作进程内，多进程部署时 Prometheus 需要分别抓取各进程（或在前面加汇总）。
+"""
+import cProfile
+import io
+import os
+import pstats
+import random
+import sqlite3
+import threading
+import time
+from collections import deque
+
+from flask import g, has_request_context, request
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()) -> str:
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in pairs) + "}"
+
+
+def _format_value(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, k)} {_format_value(v)}" for k, v in items]
+
+
+class Gauge(_Metric):
+    """func 为可选回调：返回数值，或 {标签值元组: 数值}，抓取时调用"""
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=(), func=None):
+        super().__init__(name, documentation, labelnames)
+        self.func = func
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def _samples(self):
+        if self.func is not None:
+            try:
+                value = self.func()
+            except Exception as e:
+                print(f"指标 {self.name} 读取失败: {e}")
+                return []
+            items = value.items() if isinstance(value, dict) else [((), value)]
+        else:
+            with self._lock:
+                items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, k)} {_format_value(v)}"
+                for k, v in items if v is not None]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def _samples(self):
+        with self._lock:
+            items = [(k, (list(v[0]), v[1], v[2])) for k, v in self._values.items()]
+        lines = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                labels = _format_labels(self.labelnames, key, [("le", _format_value(float(bound)))])
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, documentation, labelnames=()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=(), func=None) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames, func))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+class RequestProfiler:
+    """按需剖析请求：sample_rate 为采样概率（0 关闭），slow_ms 以上的结果才保留"""
+
+    def __init__(self, sample_rate: float = 0.0, slow_ms: float = 0.0, keep: int = 20, top: int = 30,
+                 poll_interval: float = 1.0):
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+        self.top = top
+        self.poll_interval = poll_interval
+        self.path = None
+        self._profiles = deque(maxlen=keep)
+        # 同一时刻只剖析一个请求，控制线上开销
+        self._busy = threading.Lock()
+        self._local = threading.local()
+        self._checked = 0.0
+
+    def open(self, path: str):
+        """启用跨进程共享：管理员修改的配置写入 path 指向的 SQLite 文件，各进程定期读取"""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self._conn().execute("CREATE TABLE IF NOT EXISTS profiler_config ("
+                             "id INTEGER PRIMARY KEY CHECK (id = 1), sample_rate REAL NOT NULL, "
+                             "slow_ms REAL NOT NULL, keep INTEGER NOT NULL)")
+        self._refresh(time.time())
+        return self
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        # fork 出的子进程不能沿用父进程的连接
+        if conn is None or self._local.pid != os.getpid():
+            conn = self._local.conn = sqlite3.connect(self.path, timeout=1, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.pid = os.getpid()
+        return conn
+
+    def _apply(self, sample_rate=None, slow_ms=None, keep=None):
+        if sample_rate is not None:
+            self.sample_rate = max(0.0, min(1.0, float(sample_rate)))
+        if slow_ms is not None:
+            self.slow_ms = max(0.0, float(slow_ms))
+        if keep is not None and max(1, int(keep)) != self._profiles.maxlen:
+            self._profiles = deque(self._profiles, maxlen=max(1, int(keep)))
+
+    def _refresh(self, now: float):
+        """读取共享文件中的配置（没有管理员修改过时沿用启动参数）"""
+        self._checked = now
+        try:
+            row = self._conn().execute(
+                "SELECT sample_rate, slow_ms, keep FROM profiler_config WHERE id = 1").fetchone()
+        except sqlite3.Error as e:
+            print("剖析配置读取失败，沿用本进程配置:", e)
+            return
+        if row:
+            self._apply(*row)
+
+    def configure(self, sample_rate=None, slow_ms=None, keep=None):
+        """修改配置；共享模式下写入共享文件，其他进程 poll_interval 秒内生效（写入失败抛出 sqlite3.Error）"""
+        self._apply(sample_rate, slow_ms, keep)
+        if self.path:
+            self._conn().execute(
+                "INSERT OR REPLACE INTO profiler_config (id, sample_rate, slow_ms, keep) VALUES (1, ?, ?, ?)",
+                (self.sample_rate, self.slow_ms, self._profiles.maxlen))
+
+    def start(self, forced: bool = False):
+        """需要剖析时返回已启动的 Profile，否则返回 None"""
+        if self.path:
+            now = time.time()
+            if now - self._checked >= self.poll_interval:
+                self._refresh(now)
+        if not forced and (self.sample_rate <= 0 or random.random() >= self.sample_rate):
+            return None
+        if not self._busy.acquire(blocking=False):
+            return None
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # 已有其他剖析器在运行
+            self._busy.release()
+            return None
+        return profile
+
+    def stop(self, profile, method: str, path: str, status, elapsed: float, forced: bool = False):
+        try:
+            profile.disable()
+        finally:
+            self._busy.release()
+        if not forced and elapsed * 1000 < self.slow_ms:
+            return None
+        out = io.StringIO()
+        pstats.Stats(profile, stream=out).sort_stats("cumulative").print_stats(self.top)
+        entry = {
+            "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "method": method,
+            "path": path,
+            "status": status,
+            "elapsed_ms": round(elapsed * 1000, 3),
+            "forced": forced,
+            "stats": out.getvalue()
+        }
+        self._profiles.append(entry)
+        return entry
+
+    def recent(self) -> list:
+        return list(reversed(self._profiles))
+
+    def config(self) -> dict:
+        return {"sample_rate": self.sample_rate, "slow_ms": self.slow_ms,
+                "keep": self._profiles.maxlen, "stored": len(self._profiles), "shared": self.path}
+
+
+class AppMetrics:
+    """HTTP、数据库、连接池指标的统一入口"""
+
+    def __init__(self, registry: Registry = None, profiler: RequestProfiler = None):
+        self.registry = registry or Registry()
+        self.profiler = profiler or RequestProfiler()
+        r = self.registry
+        self.http_requests = r.counter("http_requests_total", "HTTP 请求数", ("method", "route", "status"))
+        self.http_errors = r.counter("http_request_errors_total", "HTTP 5xx 响应或未处理异常数",
+                                     ("method", "route"))
+        self.http_latency = r.histogram("http_request_duration_seconds", "HTTP 请求耗时（秒）",
+                                        ("method", "route"))
+        self.db_queries = r.counter("db_queries_total", "执行的 SQL 语句数")
+        self.db_queries_per_request = r.histogram("db_queries_per_request", "每个请求执行的 SQL 条数",
+                                                  ("route",), QUERY_COUNT_BUCKETS)
+        self.db_time_per_request = r.histogram("db_query_seconds_per_request", "每个请求的 SQL 耗时合计（秒）",
+                                               ("route",))
+        self.pool_wait = r.histogram("db_pool_checkout_wait_seconds", "从连接池取连接的等待时间（秒）",
+                                     buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0))
+        self.pool_timeouts = r.counter("db_pool_checkout_timeouts_total", "取连接超时次数")
+        self.pool_checkouts = r.counter("db_pool_checkouts_total", "连接取出次数")
+        self.profiles = r.counter("profiled_requests_total", "被剖析的请求数", ("kept",))
+        self._get_engine = None
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    # ---------------- 数据库 ----------------
+    def _pool_stat(self, attr, floor=None):
+        def read():
+            pool = self._pool
+            method = getattr(pool, attr, None) if pool is not None else None
+            if not callable(method):
+                return None
+            value = method()
+            return max(floor, value) if floor is not None else value
+        return read
+
+    def _wrap_pool(self, engine):
+        """给当前连接池的 connect() 计时；engine.dispose() 换了新池时重新包装"""
+        pool = engine.pool
+        if pool is self._pool:
+            return
+        with self._pool_lock:
+            if pool is self._pool:
+                return
+            from sqlalchemy import event
+            from sqlalchemy.exc import TimeoutError as PoolTimeout
+            original = pool.connect
+
+            def timed_connect():
+                start = time.perf_counter()
+                try:
+                    return original()
+                except PoolTimeout:
+                    self.pool_timeouts.inc()
+                    raise
+                finally:
+                    self.pool_wait.observe(time.perf_counter() - start)
+            pool.connect = timed_connect
+            event.listen(pool, "checkout", lambda *args: self.pool_checkouts.inc())
+            self._pool = pool
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if has_request_context():
+            g._metrics_query_started = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.db_queries.inc()
+        if has_request_context() and "_metrics_query_started" in g:
+            g._metrics_queries = g.get("_metrics_queries", 0) + 1
+            g._metrics_query_seconds = (g.get("_metrics_query_seconds", 0.0)
+                                        + time.perf_counter() - g._metrics_query_started)
+
+    # ---------------- HTTP ----------------
+    def init_app(self, app, get_engine, allow_forced_profile=None):
+        """get_engine：返回 Engine 的函数；allow_forced_profile：判断当前请求能否用 X-Profile 强制剖析"""
+        from sqlalchemy import event
+        self._get_engine = get_engine
+        with app.app_context():
+            engine = get_engine()
+        event.listen(engine, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", self._after_cursor_execute)
+        self._wrap_pool(engine)
+        r = self.registry
+        r.gauge("db_pool_size", "连接池常驻连接数（pool_size）", func=self._pool_stat("size"))
+        r.gauge("db_pool_checked_out", "当前被占用的连接数", func=self._pool_stat("checkedout"))
+        r.gauge("db_pool_checked_in", "当前空闲的连接数", func=self._pool_stat("checkedin"))
+        r.gauge("db_pool_overflow", "当前溢出连接数（超过 pool_size 的部分，上限 max_overflow）",
+                func=self._pool_stat("overflow", floor=0))
+
+        @app.before_request
+        def metrics_start_request():
+            self._wrap_pool(self._get_engine())
+            g._metrics_started = time.perf_counter()
+            forced = bool(request.headers.get("X-Profile")) and bool(allow_forced_profile and allow_forced_profile())
+            g._metrics_profile = self.profiler.start(forced)
+            g._metrics_profile_forced = forced
+
+        @app.after_request
+        def metrics_record_status(response):
+            g._metrics_status = response.status_code
+            return response
+
+        @app.teardown_request
+        def metrics_end_request(exc):
+            started = g.pop("_metrics_started", None)
+            if started is None:
+                return
+            elapsed = time.perf_counter() - started
+            method = request.method
+            # 未匹配到路由的请求（404）统一归为一个标签，避免标签数量失控
+            route = request.url_rule.rule if request.url_rule else "<unmatched>"
+            status = 500 if exc is not None else g.get("_metrics_status", 500)
+            self.http_requests.inc(method=method, route=route, status=status)
+            self.http_latency.observe(elapsed, method=method, route=route)
+            if status >= 500:
+                self.http_errors.inc(method=method, route=route)
+            self.db_queries_per_request.observe(g.get("_metrics_queries", 0), route=route)
+            self.db_time_per_request.observe(g.get("_metrics_query_seconds", 0.0), route=route)
+            profile = g.pop("_metrics_profile", None)
+            if profile is not None:
+                kept = self.profiler.stop(profile, method, request.full_path.rstrip("?"), status, elapsed,
+                                          forced=g.get("_metrics_profile_forced", False))
+                self.profiles.inc(kept="true" if kept else "false")
+
+    def render(self) -> str:
+        return self.registry.render()
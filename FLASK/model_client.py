@@ -0,0 +1,235 @@
+"""模型服务客户端
+
+- 长连接池：复用 requests.Session 的 keep-alive 连接，连接超时和读取超时分开设置；
+- 熔断器：连续失败达到阈值后直接熔断，请求立即走规则兜底，由后台线程定期探测服务是否恢复；
+- 微批处理（可选）：把并发到达的单条请求攒成 N 条或等待 T 毫秒后一次发到批量接口。
+"""
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from queue import Queue, Empty
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class ModelUnavailable(Exception):
+    """模型服务不可用（调用失败或返回格式不正确）"""
+
+
+class CircuitOpen(ModelUnavailable):
+    """熔断器处于打开状态，本次未发起调用"""
+
+
+class CircuitBreaker:
+    """连续失败 failure_threshold 次后打开；打开后由探测成功来关闭"""
+
+    CLOSED, OPEN = "closed", "open"
+
+    def __init__(self, failure_threshold: int = 5):
+        self.failure_threshold = failure_threshold
+        self.state = self.CLOSED
+        self.failures = 0          # 当前连续失败次数
+        self.opened_at = None
+        self.open_count = 0        # 累计熔断次数
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        return self.state == self.CLOSED
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.state = self.CLOSED
+            self.opened_at = None
+
+    def record_failure(self) -> bool:
+        """记录一次失败，返回本次是否刚刚触发熔断"""
+        with self._lock:
+            self.failures += 1
+            if self.state == self.CLOSED and self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.time()
+                self.open_count += 1
+                return True
+            return False
+
+
+class ModelClient:
+    def __init__(self, url: str, batch_url: str = None, connect_timeout: float = 1.0,
+                 read_timeout: float = 5.0, pool_size: int = 20, failure_threshold: int = 5,
+                 probe_interval: float = 5.0, batch_size: int = 0, batch_wait_ms: float = 10.0):
+        self.url = url
+        self.batch_url = batch_url or url.rstrip("/") + "/batch"
+        self.timeout = (connect_timeout, read_timeout)
+        self.probe_interval = probe_interval
+        self.breaker = CircuitBreaker(failure_threshold)
+        self.pool_size = pool_size
+        self._session = self._new_session()
+        self._latencies = deque(maxlen=1000)   # 最近成功调用的耗时（秒）
+        self._counters = {"calls": 0, "failures": 0, "rejected": 0, "batches": 0}
+        self._last_error = None
+        self._stats_lock = threading.Lock()
+        self._probe_thread = None
+        self._probe_lock = threading.Lock()
+        # 微批处理：batch_size > 1 时启用
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait_ms / 1000.0
+        self._queue = None
+        if batch_size > 1:
+            self._queue = Queue()
+            threading.Thread(target=self._batch_loop, name="model-batcher", daemon=True).start()
+        # 应用在 fork 之前加载时，子进程重建连接池和后台线程（线程不会随 fork 复制）
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    # ---------------- 对外接口 ----------------
+    def predict(self, text: str) -> dict:
+        """分析单条文本；服务不可用时抛出 ModelUnavailable"""
+        if self._queue is not None:
+            self._check_breaker()
+            future = Future()
+            self._queue.put((text, future))
+            try:
+                return future.result(timeout=sum(self.timeout) + self.batch_wait + 1)
+            except FutureTimeout:
+                raise ModelUnavailable("等待批量结果超时")
+        return self._post(self.url, {"text": text})
+
+    def predict_many(self, texts: list) -> list:
+        """一次请求分析多条文本，返回与输入等长的结果列表"""
+        def check(result):
+            results = result.get("results")
+            if not isinstance(results, list) or len(results) != len(texts):
+                raise ValueError("批量模型返回条数与输入不一致")
+            if not all(isinstance(item, dict) for item in results):
+                raise ValueError("批量模型返回的结果格式不正确")
+        return self._post(self.batch_url, {"texts": texts}, check)["results"]
+
+    def status(self) -> dict:
+        """熔断状态与调用耗时统计"""
+        with self._stats_lock:
+            samples = sorted(self._latencies)
+            data = dict(self._counters)
+            data["last_error"] = self._last_error
+
+        def pct(p):
+            return round(samples[min(len(samples) - 1, int(len(samples) * p))] * 1000, 2) if samples else None
+        data.update({
+            "url": self.url,
+            "breaker_state": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+            "breaker_open_count": self.breaker.open_count,
+            "opened_at": self.breaker.opened_at,
+            "latency_ms": {
+                "avg": round(sum(samples) / len(samples) * 1000, 2) if samples else None,
+                "p50": pct(0.5), "p95": pct(0.95), "p99": pct(0.99),
+                "samples": len(samples)
+            },
+            "micro_batch": {"batch_size": self.batch_size, "wait_ms": self.batch_wait * 1000}
+            if self._queue is not None else None
+        })
+        return data
+
+    def close(self):
+        self._session.close()
+
+    # ---------------- 内部实现 ----------------
+    def _new_session(self) -> requests.Session:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def _after_fork(self):
+        self._session = self._new_session()
+        self.breaker._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._probe_lock = threading.Lock()
+        self._probe_thread = None
+        if self._queue is not None:
+            self._queue = Queue()
+            threading.Thread(target=self._batch_loop, name="model-batcher", daemon=True).start()
+        if self.breaker.state == "open":
+            self._start_probe()
+
+    def _check_breaker(self):
+        if not self.breaker.allow():
+            with self._stats_lock:
+                self._counters["rejected"] += 1
+            raise CircuitOpen("模型服务熔断中")
+
+    def _post(self, url: str, payload: dict, check=None) -> dict:
+        """check(结果)：进一步校验返回内容，抛出 ValueError 时与调用失败一样计入熔断"""
+        self._check_breaker()
+        start = time.perf_counter()
+        with self._stats_lock:
+            self._counters["calls"] += 1
+        try:
+            response = self._session.post(url, json=payload, timeout=self.timeout)
+            response.raise_for_status()
+            result = response.json()
+            if not isinstance(result, dict):
+                raise ValueError("模型返回格式不正确")
+            if check is not None:
+                check(result)
+        except Exception as e:
+            self._on_failure(e)
+            raise ModelUnavailable(str(e)) from e
+        with self._stats_lock:
+            self._latencies.append(time.perf_counter() - start)
+        self.breaker.record_success()
+        return result
+
+    def _on_failure(self, error: Exception):
+        with self._stats_lock:
+            self._counters["failures"] += 1
+            self._last_error = f"{type(error).__name__}: {error}"
+        if self.breaker.record_failure():
+            self._start_probe()
+
+    def _start_probe(self):
+        """熔断后启动后台探测线程，服务恢复后关闭熔断器"""
+        with self._probe_lock:
+            if self._probe_thread is not None and self._probe_thread.is_alive():
+                return
+            self._probe_thread = threading.Thread(target=self._probe_loop, name="model-probe", daemon=True)
+            self._probe_thread.start()
+
+    def _probe_loop(self):
+        while not self.breaker.allow():
+            time.sleep(self.probe_interval)
+            try:
+                response = self._session.post(self.url, json={"text": "服务探测"}, timeout=self.timeout)
+                response.raise_for_status()
+            except Exception as e:
+                with self._stats_lock:
+                    self._last_error = f"探测失败 {type(e).__name__}: {e}"
+                continue
+            self.breaker.record_success()
+
+    def _batch_loop(self):
+        """攒够 batch_size 条或首条等待 batch_wait 秒后，一次调用批量接口"""
+        while True:
+            items = [self._queue.get()]
+            deadline = time.monotonic() + self.batch_wait
+            while len(items) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    items.append(self._queue.get(timeout=remaining))
+                except Empty:
+                    break
+            with self._stats_lock:
+                self._counters["batches"] += 1
+            try:
+                results = self.predict_many([text for text, _ in items])
+            except Exception as e:
+                for _, future in items:
+                    future.set_exception(e if isinstance(e, ModelUnavailable) else ModelUnavailable(str(e)))
+                continue
+            for (_, future), result in zip(items, results):
+                future.set_result(result)
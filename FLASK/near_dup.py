@@ -0,0 +1,333 @@
+"""近重复短信检测（MinHash + LSH）
+
+诈骗团伙群发的短信往往只改电话、链接、称呼，精确匹配找不到，两两比较在百万条时又太慢：
+- 特征：先按 result_cache.normalize_text 归一化（网址 -> url、数字 -> 0、去标点），
+  再用 text_lexicon 分词器切词、去停用词、同义词替换为组代表词，取词集合；
+- 签名：对词集合做 bands * rows 个 MinHash，两条短信签名某一位相同的概率等于词集合的 Jaccard 相似度；
+- LSH：签名分成 bands 段，每段哈希成一个桶号；只要有一段桶号相同即为候选，
+  再按签名估算相似度过滤。默认 8 段 * 4 行，相似度 0.8 的短信 98% 会成为候选，0.3 的只有 6%；
+- 批次（campaign）：记录加入索引时与相似度 >= cluster_threshold 的旧记录合并（并查集），
+  批次 id 取批次中最早一条记录的 id。
+
+内存：每条记录只保存每行 1 字节的签名低位（b-bit MinHash）和每段一个 8 字节的“桶号 << 32 | 槽位”，
+各段按桶号排好序放在 array 中二分查找，新记录先进待归并字典，攒够后归并进有序数组。
+与全文索引一样，每次查询前按 id > 已索引最大 id 增量拉取新记录（已有线程在拉取时不等待）；
+删除、归档的记录用 remove() 移出索引（不再作为候选，批次条数扣减），签名占用的内存要到重建后才释放。
+"""
+import bisect
+import hashlib
+import heapq
+import os
+import random
+import threading
+import time
+from array import array
+
+from sqlalchemy import select
+
+from result_cache import normalize_text
+
+_PRIME = (1 << 61) - 1
+_SLOT_MASK = (1 << 32) - 1
+
+
+def encode_case_no(case_no: str) -> int:
+    """'a00001' -> 整数（类别字母 << 20 | 序号），节省内存"""
+    if not case_no or not case_no[1:].isdigit():
+        return 0
+    return (ord(case_no[0]) << 20) | int(case_no[1:])
+
+
+def decode_case_no(value: int) -> str:
+    return f"{chr(value >> 20)}{value & 0xFFFFF:05d}" if value else None
+
+
+def _hash64(data: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "little")
+
+
+class NearDupIndex:
+    def __init__(self, tokenizer, get_engine, table, bands: int = 8, rows: int = 4,
+                 cluster_threshold: float = 0.7, min_features: int = 4, sync_interval: float = 0.5,
+                 chunk_size: int = 5000, max_bucket_scan: int = 2000, merge_every: int = 20000,
+                 retry_interval: float = 60):
+        # table: sms_record 表对象；get_engine: 返回 Engine 的函数
+        self.tokenizer = tokenizer
+        self._get_engine = get_engine
+        self._table = table
+        self.bands = bands
+        self.rows = rows
+        self.num_perm = bands * rows
+        self.cluster_threshold = cluster_threshold
+        self.min_features = min_features      # 特征太少的短信（如“你好”）不建索引，避免误聚类
+        self.sync_interval = sync_interval
+        self.chunk_size = chunk_size
+        self.max_bucket_scan = max_bucket_scan  # 单个桶最多比较最近的多少条（群发的相同短信会挤在一个桶里）
+        self.merge_every = merge_every
+        self.retry_interval = retry_interval    # 构建失败后隔多久再试
+        # 固定种子：各工作进程、每次重启得到相同的签名
+        rng = random.Random(20240601)
+        self._perms = [(rng.randrange(1, _PRIME), rng.randrange(0, _PRIME)) for _ in range(self.num_perm)]
+        self._init_locks()
+        self._failed_at = 0.0
+        self.reset()
+        os.register_at_fork(after_in_child=self._init_locks)
+
+    def _init_locks(self):
+        # fork 出的子进程不继承构建线程，锁也可能停在被持有的状态
+        self._lock = threading.RLock()
+        self._sync_lock = threading.Lock()
+        self._building = None
+
+    def reset(self):
+        with self._lock:
+            # 以下数组按“槽位”对齐，槽位即记录加入索引的顺序（记录 id 递增）
+            self._ids = array("q")        # 记录 id
+            self._cases = array("l")      # 编码后的案件编号
+            self._parent = array("q")     # 并查集父节点槽位
+            self._sigs = bytearray()      # 每条 num_perm 字节的签名低位
+            self._sizes = {}              # 批次根槽位 -> 条数（只记录 2 条及以上的批次）
+            self._samples = {}            # 批次根槽位 -> 前几条记录的槽位
+            self._removed = set()         # 已删除、已归档的记录的槽位
+            self._main = [array("Q") for _ in range(self.bands)]   # 有序的 桶号 << 32 | 槽位
+            self._pending = [{} for _ in range(self.bands)]        # 桶号 -> [槽位]，待归并
+            self._pending_count = 0
+            self.last_id = 0
+            self._last_sync = 0.0
+            self.ready = False
+
+    # ---------------- 签名 ----------------
+    def features(self, text: str) -> set:
+        tokens = self.tokenizer.tokenize(normalize_text(text or ""))
+        return set(self.tokenizer.normalize(tokens))
+
+    def signature(self, text: str):
+        """返回 num_perm 个 MinHash 值；特征不足时返回 None"""
+        feats = self.features(text)
+        if len(feats) < self.min_features:
+            return None
+        hashes = [_hash64(token.encode("utf-8")) for token in feats]
+        return [min((a * h + b) % _PRIME for h in hashes) for a, b in self._perms]
+
+    def _band_keys(self, sig) -> list:
+        r = self.rows
+        return [_hash64(repr((band, sig[band * r:(band + 1) * r])).encode()) >> 32
+                for band in range(self.bands)]
+
+    def _similarity(self, low: bytes, slot: int) -> float:
+        """按签名低 8 位估算 Jaccard 相似度（扣除低位偶然相同的 1/256）"""
+        n = self.num_perm
+        stored = self._sigs[slot * n:(slot + 1) * n]
+        same = sum(1 for x, y in zip(low, stored) if x == y) / n
+        return max(0.0, (same - 1 / 256) / (1 - 1 / 256))
+
+    # ---------------- 建索引 ----------------
+    def _find(self, slot: int) -> int:
+        parent = self._parent
+        root = slot
+        while parent[root] != root:
+            root = parent[root]
+        while parent[slot] != root:          # 路径压缩
+            parent[slot], slot = root, parent[slot]
+        return root
+
+    def _union(self, a: int, b: int):
+        ra, rb = self._find(a), self._find(b)
+        if ra == rb:
+            return
+        if ra > rb:                          # 根取较早的槽位，批次 id 稳定
+            ra, rb = rb, ra
+        self._parent[rb] = ra
+        self._sizes[ra] = self._sizes.pop(ra, 1) + self._sizes.pop(rb, 1)
+        self._samples[ra] = (self._samples.pop(ra, [ra]) + self._samples.pop(rb, [rb]))[:5]
+
+    def _candidates(self, keys, limit: int = None) -> set:
+        """各段同桶的记录（每个桶只取最近的 max_bucket_scan 条）；给出 limit 时凑够 limit 个即停止"""
+        scan = self.max_bucket_scan if limit is None else min(self.max_bucket_scan, limit)
+        slots = set()
+        for band, key in enumerate(keys):
+            main = self._main[band]
+            hi = bisect.bisect_left(main, (key + 1) << 32)
+            lo = max(bisect.bisect_left(main, key << 32), hi - scan)
+            slots.update(self._pending[band].get(key, ())[-scan:])
+            slots.update(packed & _SLOT_MASK for packed in main[lo:hi])
+            if limit is not None and len(slots) >= limit:
+                break
+        return slots
+
+    def _scored(self, sig, min_similarity: float, exclude=None, limit: int = None) -> list:
+        """[(相似度, 槽位)]，只含达到 min_similarity 的候选；limit 为最多比较的候选数"""
+        low = bytes(v & 0xFF for v in sig)
+        result = []
+        for slot in self._candidates(self._band_keys(sig), limit):
+            if slot != exclude and slot not in self._removed:
+                score = self._similarity(low, slot)
+                if score >= min_similarity:
+                    result.append((score, slot))
+        return result
+
+    def _merge_pending(self):
+        for band in range(self.bands):
+            pending = sorted((key << 32) | slot for key, slots in self._pending[band].items() for slot in slots)
+            self._main[band] = array("Q", heapq.merge(self._main[band], pending))
+            self._pending[band] = {}
+        self._pending_count = 0
+
+    def add(self, doc_id: int, text: str, case_no: str = None):
+        sig = self.signature(text)
+        with self._lock:
+            if doc_id <= self.last_id:
+                return
+            self.last_id = doc_id
+            if sig is None:
+                return
+            near = self._scored(sig, self.cluster_threshold)
+            slot = len(self._ids)
+            self._ids.append(doc_id)
+            self._cases.append(encode_case_no(case_no))
+            self._parent.append(slot)
+            self._sigs.extend(v & 0xFF for v in sig)
+            for band, key in enumerate(self._band_keys(sig)):
+                self._pending[band].setdefault(key, []).append(slot)
+            self._pending_count += 1
+            # 待归并条数随索引规模增大，归并的总代价与记录数成线性
+            if self._pending_count >= max(self.merge_every, len(self._ids) // 4):
+                self._merge_pending()
+            for _, other in near:
+                self._union(slot, other)
+
+    def sync(self, force: bool = False, wait: bool = True) -> int:
+        """拉取 id 大于已索引最大 id 的新记录，返回新增条数；wait=False 时已有线程在拉取就直接返回"""
+        if not force and time.time() - self._last_sync < self.sync_interval:
+            return 0
+        if not self._sync_lock.acquire(blocking=wait):
+            return 0
+        added = 0
+        try:
+            t = self._table
+            while True:
+                stmt = (select(t.c.id, t.c.sms_text, t.c.case_no)
+                        .where(t.c.id > self.last_id).order_by(t.c.id.asc()).limit(self.chunk_size))
+                with self._get_engine().connect() as conn:
+                    rows = conn.execute(stmt).fetchall()
+                for row in rows:
+                    self.add(row.id, row.sms_text, row.case_no)
+                added += len(rows)
+                if len(rows) < self.chunk_size:
+                    break
+            self._last_sync = time.time()
+        finally:
+            self._sync_lock.release()
+        return added
+
+    def remove(self, ids) -> int:
+        """把已删除或已归档的记录移出索引：不再作为候选返回，所在批次的条数相应扣减"""
+        removed = 0
+        with self._lock:
+            for doc_id in ids:
+                slot = self._slot_of(doc_id)
+                if slot is None or slot in self._removed:
+                    continue
+                self._removed.add(slot)
+                root = self._find(slot)
+                if root in self._sizes:
+                    self._sizes[root] -= 1
+                removed += 1
+        return removed
+
+    def build_in_background(self, app):
+        """在后台线程建索引（已建好、正在建或刚失败过时直接返回，可以每个请求都调用）"""
+        if self.ready or self._building is not None or time.time() - self._failed_at < self.retry_interval:
+            return
+        with self._lock:
+            if self.ready or self._building is not None:
+                return
+
+            def run():
+                try:
+                    with app.app_context():
+                        self.sync(force=True)
+                    self.ready = True
+                except Exception as e:
+                    self._failed_at = time.time()
+                    print("相似短信索引构建失败:", e)
+                finally:
+                    self._building = None
+            self._building = threading.Thread(target=run, name="near-dup-build", daemon=True)
+            self._building.start()
+
+    # ---------------- 查询 ----------------
+    def _slot_of(self, doc_id: int):
+        i = bisect.bisect_left(self._ids, doc_id)
+        return i if i < len(self._ids) and self._ids[i] == doc_id else None
+
+    def _hit(self, slot: int, score: float) -> dict:
+        root = self._find(slot)
+        return {
+            "id": self._ids[slot],
+            "case_no": decode_case_no(self._cases[slot]),
+            "similarity": round(score, 4),
+            "campaign_id": self._ids[root],
+            "campaign_size": self._sizes.get(root, 1)
+        }
+
+    def similar(self, text: str, k: int = 10, min_similarity: float = 0.5, exclude_id: int = None,
+                max_candidates: int = None) -> list:
+        """查找与 text 最相似的 k 条已索引记录（按估算的相似度降序），exclude_id 为要排除的记录自身
+
+        max_candidates 限制最多比较的候选数（分析接口的提示用，耗时有上限，代价是可能漏掉一些相似记录）
+        """
+        sig = self.signature(text)
+        if sig is None:
+            return []
+        with self._lock:
+            exclude = self._slot_of(exclude_id) if exclude_id is not None else None
+            scored = self._scored(sig, min_similarity, exclude, max_candidates)
+            return [self._hit(slot, score) for score, slot in heapq.nlargest(k, scored)]
+
+    def campaign_of(self, doc_id: int):
+        """记录所属批次 id（批次中最早一条记录的 id）；未建索引的记录返回 None"""
+        with self._lock:
+            slot = self._slot_of(doc_id)
+            return self._ids[self._find(slot)] if slot is not None else None
+
+    def campaigns(self, min_size: int = 2, top: int = 20) -> list:
+        """条数最多的批次：[{campaign_id, size, sample_case_nos}]"""
+        with self._lock:
+            biggest = heapq.nlargest(top, ((n, root) for root, n in self._sizes.items() if n >= min_size))
+            return [{
+                "campaign_id": self._ids[root],
+                "size": n,
+                "sample_case_nos": [decode_case_no(self._cases[s]) for s in self._samples.get(root, [root])
+                                    if s not in self._removed]
+            } for n, root in biggest]
+
+    def members(self, campaign_id: int, limit: int = 200) -> list:
+        """批次内的记录 id（需扫描批次之后的全部槽位，供后台查看）"""
+        with self._lock:
+            root = self._slot_of(campaign_id)
+            if root is None:
+                return []
+            root = self._find(root)
+            result = []
+            for slot in range(root, len(self._ids)):   # 根是批次中最早的槽位
+                if slot not in self._removed and self._find(slot) == root:
+                    result.append(self._ids[slot])
+                    if len(result) >= limit:
+                        break
+            return result
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "ready": self.ready,
+                "building": self._building is not None,
+                "indexed": len(self._ids) - len(self._removed),
+                "removed": len(self._removed),
+                "last_id": self.last_id,
+                "campaigns": len(self._sizes),
+                "largest_campaign": max(self._sizes.values(), default=1),
+                "bands": self.bands,
+                "rows": self.rows,
+                "cluster_threshold": self.cluster_threshold
+            }
@@ -0,0 +1,105 @@
+"""游标（keyset）分页
+
+OFFSET 分页翻到第 N 页时数据库要先扫过前面所有行，还要再做一次 COUNT(*)。
+游标分页用上一页最后一行的排序键作为条件（WHERE (created_at, id) < (...)），
+每一页都只走索引取 per_page + 1 行，第 N 页和第 1 页代价相同。
+游标对前端是不透明的字符串，原样回传即可。
+"""
+import base64
+import json
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import DateTime, and_, or_
+
+
+def encode_cursor(values, direction: str) -> str:
+    payload = {"d": direction, "k": [v.isoformat() if isinstance(v, datetime) else v for v in values]}
+    raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: str, columns) -> tuple:
+    """解析游标，返回 (方向, 排序键取值)；格式不正确时抛出 ValueError"""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        payload = json.loads(raw)
+        direction, values = payload["d"], payload["k"]
+    except Exception:
+        raise ValueError("无效的分页游标")
+    if direction not in ("n", "p") or len(values) != len(columns):
+        raise ValueError("无效的分页游标")
+    parsed = []
+    for col, v in zip(columns, values):
+        if v is not None and isinstance(col.type, DateTime):
+            v = datetime.fromisoformat(v)
+        parsed.append(v)
+    return direction, parsed
+
+
+def _after(columns, values, descending: bool):
+    """构造“排在 values 之后”的条件，展开成 OR/AND 以兼容不支持行值比较的数据库"""
+    conditions = []
+    for i, col in enumerate(columns):
+        cmp = col < values[i] if descending else col > values[i]
+        conditions.append(and_(*[columns[j] == values[j] for j in range(i)], cmp))
+    return or_(*conditions)
+
+
+def keyset_paginate(query, columns, row_key, cursor: str, per_page: int, descending: bool = False) -> dict:
+    """对 query 做游标分页
+
+    columns: 排序键列，如 [SmsRecord.id] 或 [ReportRecord.created_at, ReportRecord.id]
+    row_key: 从结果行取出排序键取值的函数
+    cursor: 上一次返回的 next_cursor / prev_cursor，空字符串或 None 表示第一页
+    返回 {"items", "next_cursor", "prev_cursor"}
+    """
+    direction, values = decode_cursor(cursor, columns) if cursor else ("n", None)
+    # 向前翻页时反向排序取数，取完再倒回来
+    reverse = direction == "p"
+    desc_now = descending != reverse
+    if values is not None:
+        query = query.filter(_after(columns, values, desc_now))
+    query = query.order_by(*[c.desc() if desc_now else c.asc() for c in columns])
+    rows = query.limit(per_page + 1).all()
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if reverse:
+        rows.reverse()
+    next_cursor = prev_cursor = None
+    if rows:
+        if has_more or reverse:
+            next_cursor = encode_cursor(row_key(rows[-1]), "n")
+        if (has_more and reverse) or (not reverse and values is not None):
+            prev_cursor = encode_cursor(row_key(rows[0]), "p")
+    return {"items": rows, "next_cursor": next_cursor, "prev_cursor": prev_cursor}
+
+
+class CountCache:
+    """带 TTL 的 COUNT 结果缓存：同样的筛选条件在 ttl 秒内只真正统计一次"""
+
+    def __init__(self, ttl: float = 30, max_entries: int = 256):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, compute):
+        now = time.time()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[1] > now:
+                return entry[0]
+        value = compute()
+        with self._lock:
+            if len(self._data) >= self.max_entries:
+                self._data = {k: v for k, v in self._data.items() if v[1] > now}
+                if len(self._data) >= self.max_entries:
+                    self._data.clear()
+            self._data[key] = (value, now + self.ttl)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
@@ -0,0 +1,267 @@
+"""后台分块清理任务
+
+大批量删除 sms_record（一键重置、按类别重置、删除用户）如果放在一个事务里，
+会长时间锁表并阻塞 analyze_text 的写入。这里改为后台线程按主键分块删除：
+每块一个短事务，块与块之间休眠一下，给正常请求让路。
+
+任务状态保存在 purge_job 表中，任何工作进程都能查询进度或请求取消；
+清理对象以任务开始时的最大 id 为界，最后再在一个事务里扫尾并执行收尾动作（如计数器归 1），
+因此计数器只在清理全部完成后才会重置。
+
+同样的分块机制也用于不删除记录的批量处理（如规则集更新后重新分类）：按 id 游标逐块处理，
+进度记在同一张表的 deleted 列（已处理条数）中，游标记在 last_id 列，同样可以查询和取消，
+被接管时从 last_id 之后继续，不会把已处理的记录再处理一遍。
+
+任务线程是工作进程中的后台线程，进程被回收（如 gunicorn max_requests）时任务会停在中途。
+因此任务行记录所属进程（owner，主机名:pid），进程内的监视线程每 heartbeat_interval 秒刷新
+本进程任务的 heartbeat_at；各进程的监视线程同时检查心跳超过 stale_after 秒的任务，
+用条件更新抢占后，能接管的类型（登记过 resumable）在本进程从中断处继续，不能接管的标记为失败。
+"""
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import delete, func, or_, select, update
+
+# 任务状态
+PENDING, RUNNING, CANCELLING = "pending", "running", "cancelling"
+COMPLETED, CANCELLED, FAILED = "completed", "cancelled", "failed"
+ACTIVE_STATES = (PENDING, RUNNING, CANCELLING)
+
+
+class PurgeJobManager:
+    def __init__(self, db, job_model, record_table, chunk_size: int = 1000, pause: float = 0.05,
+                 heartbeat_interval: float = 10, stale_after: float = 60):
+        # job_model: purge_job 表模型；record_table: 被清理的 sms_record 表对象
+        self.db = db
+        self.Job = job_model
+        self.records = record_table
+        self.chunk_size = chunk_size
+        self.pause = pause
+        self.heartbeat_interval = heartbeat_interval
+        self.stale_after = stale_after
+        self._resumers = {}
+        self._init_state()
+        os.register_at_fork(after_in_child=self._init_state)
+
+    def _init_state(self):
+        # 子进程不继承父进程的任务线程和监视线程
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"[-64:]
+        self._active = set()        # 本进程正在执行的任务 id
+        self._lock = threading.Lock()
+        self._monitor = None
+
+    def resumable(self, kind: str, factory):
+        """登记可接管的任务类型：factory(任务行) 返回 start() 的 condition/before_delete/finish/after
+        或 start_chunked() 的 condition/process/chunk_size 参数（dict），返回 None 表示不能接管"""
+        self._resumers[kind] = factory
+
+    def start(self, kind: str, target: str, condition, before_delete=None, finish=None, after=None) -> int:
+        """登记任务并启动后台线程（在请求上下文中调用），立即返回任务 id
+
+        condition: 待删除记录的筛选条件
+        before_delete(session, 条件): 每块删除前在同一事务中调用（如扣减统计汇总）
+        finish(session): 全部删完后在扫尾事务中调用（如计数器归 1、删除用户本身）
+        after(): 扫尾事务提交后调用（如丢弃本进程内存中的旧号段）
+        """
+        job_id, max_id = self._register(kind, target, condition)
+        self._spawn(self._run, current_app._get_current_object(), job_id, condition, max_id,
+                    before_delete, finish, after)
+        return job_id
+
+    def start_chunked(self, kind: str, target: str, condition, process, chunk_size: int = None) -> int:
+        """登记按 id 分块处理（不删除）的任务并启动后台线程，立即返回任务 id
+
+        process(session, ids): 在每块的事务中处理这些记录，返回处理条数
+        """
+        job_id, max_id = self._register(kind, target, condition)
+        self._spawn(self._run_chunked, current_app._get_current_object(), job_id, condition, max_id, process,
+                    chunk_size or self.chunk_size)
+        return job_id
+
+    def _spawn(self, target, app, job_id, *args):
+        with self._lock:
+            self._active.add(job_id)
+        threading.Thread(target=target, args=(app, job_id, *args), name=f"purge-job-{job_id}", daemon=True).start()
+        self.start_monitor(app)
+
+    def _register(self, kind, target, condition):
+        db = self.db
+        max_id = db.session.execute(select(func.max(self.records.c.id)).where(condition)).scalar() or 0
+        total = db.session.execute(select(func.count()).select_from(self.records).where(condition)).scalar()
+        job = self.Job(kind=kind, target=target, status=PENDING, total=total, deleted=0, max_id=max_id,
+                       owner=self.owner, heartbeat_at=datetime.now())
+        db.session.add(job)
+        db.session.commit()
+        return job.id, max_id
+
+    def cancel(self, job_id: int) -> bool:
+        """请求取消：正在运行的任务会在下一块开始前停下"""
+        updated = self.db.session.execute(
+            update(self.Job.__table__)
+            .where(self.Job.__table__.c.id == job_id, self.Job.__table__.c.status.in_([PENDING, RUNNING]))
+            .values(status=CANCELLING)
+        ).rowcount
+        self.db.session.commit()
+        return bool(updated)
+
+    def _set(self, session, job_id, **values):
+        session.execute(update(self.Job.__table__).where(self.Job.__table__.c.id == job_id).values(**values))
+
+    def _status(self, session, job_id):
+        return session.execute(
+            select(self.Job.__table__.c.status).where(self.Job.__table__.c.id == job_id)
+        ).scalar()
+
+    def _run(self, app, job_id, condition, max_id, before_delete, finish, after, deleted: int = 0):
+        t = self.records
+        with app.app_context():
+            session = self.db.session
+            try:
+                self._set(session, job_id, status=RUNNING)
+                session.commit()
+                while True:
+                    if self._status(session, job_id) == CANCELLING:
+                        self._set(session, job_id, status=CANCELLED)
+                        session.commit()
+                        return
+                    ids = [row[0] for row in session.execute(
+                        select(t.c.id).where(condition, t.c.id <= max_id).order_by(t.c.id).limit(self.chunk_size)
+                    )]
+                    if not ids:
+                        break
+                    chunk = t.c.id.in_(ids)
+                    if before_delete:
+                        before_delete(session, chunk)
+                    deleted += session.execute(delete(t).where(chunk)).rowcount
+                    self._set(session, job_id, deleted=deleted)
+                    session.commit()
+                    time.sleep(self.pause)
+                # 扫尾：删除清理期间新写入的少量记录并执行收尾动作，放在同一事务中
+                if before_delete:
+                    before_delete(session, condition)
+                deleted += session.execute(delete(t).where(condition)).rowcount
+                if finish:
+                    finish(session)
+                self._set(session, job_id, status=COMPLETED, deleted=deleted)
+                session.commit()
+                if after:
+                    after()
+            except Exception as e:
+                session.rollback()
+                print(f"清理任务 {job_id} 失败: {e}")
+                self._set(session, job_id, status=FAILED, error=str(e)[:1000])
+                session.commit()
+            finally:
+                self._release(job_id)
+                self.db.session.remove()
+
+    def _run_chunked(self, app, job_id, condition, max_id, process, chunk_size, done: int = 0, last_id: int = 0):
+        t = self.records
+        with app.app_context():
+            session = self.db.session
+            try:
+                self._set(session, job_id, status=RUNNING)
+                session.commit()
+                while True:
+                    if self._status(session, job_id) == CANCELLING:
+                        self._set(session, job_id, status=CANCELLED)
+                        session.commit()
+                        return
+                    ids = [row[0] for row in session.execute(
+                        select(t.c.id).where(condition, t.c.id > last_id, t.c.id <= max_id)
+                        .order_by(t.c.id).limit(chunk_size)
+                    )]
+                    if not ids:
+                        break
+                    done += process(session, ids)
+                    last_id = ids[-1]
+                    self._set(session, job_id, deleted=done, last_id=last_id)  # 与本块的处理结果一起提交
+                    session.commit()
+                    time.sleep(self.pause)
+                self._set(session, job_id, status=COMPLETED, deleted=done)
+                session.commit()
+            except Exception as e:
+                session.rollback()
+                print(f"后台任务 {job_id} 失败: {e}")
+                self._set(session, job_id, status=FAILED, error=str(e)[:1000])
+                session.commit()
+            finally:
+                self._release(job_id)
+                self.db.session.remove()
+
+    def _release(self, job_id):
+        with self._lock:
+            self._active.discard(job_id)
+
+    # ---------------- 心跳与接管 ----------------
+    def start_monitor(self, app):
+        """启动本进程的监视线程（刷新心跳、接管中断的任务），可重复调用"""
+        if self._monitor is not None:
+            return
+        with self._lock:
+            if self._monitor is not None:
+                return
+            self._monitor = threading.Thread(target=self._watch, args=(app,), name="purge-job-monitor", daemon=True)
+        self._monitor.start()
+
+    def _watch(self, app):
+        while True:
+            time.sleep(self.heartbeat_interval)
+            try:
+                with app.app_context():
+                    self.beat()
+                    self.reap(app)
+            except Exception as e:
+                print("清理任务心跳或接管失败:", e)
+
+    def beat(self):
+        """刷新本进程正在执行的任务的心跳"""
+        with self._lock:
+            ids = list(self._active)
+        if ids:
+            J = self.Job.__table__
+            with self.db.engine.begin() as conn:
+                conn.execute(update(J).where(J.c.id.in_(ids)).values(heartbeat_at=datetime.now()))
+
+    def reap(self, app) -> list:
+        """接管心跳超时的任务（所属进程已退出），返回处理过的任务 id"""
+        J = self.Job.__table__
+        cutoff = datetime.now() - timedelta(seconds=self.stale_after)
+        stale = (J.c.status.in_(ACTIVE_STATES), or_(J.c.heartbeat_at.is_(None), J.c.heartbeat_at < cutoff))
+        with self.db.engine.connect() as conn:
+            jobs = conn.execute(
+                select(J.c.id, J.c.kind, J.c.target, J.c.status, J.c.max_id, J.c.deleted, J.c.last_id, J.c.owner).where(*stale)
+            ).fetchall()
+        handled = []
+        for job in jobs:
+            # 条件更新抢占：多个进程同时发现时只有一个能改到心跳
+            with self.db.engine.begin() as conn:
+                claimed = conn.execute(update(J).where(J.c.id == job.id, *stale)
+                                       .values(owner=self.owner, heartbeat_at=datetime.now())).rowcount
+            if not claimed:
+                continue
+            handled.append(job.id)
+            spec = None
+            if job.status != CANCELLING and job.kind in self._resumers:
+                try:
+                    spec = self._resumers[job.kind](job)
+                except Exception as e:
+                    print(f"无法接管任务 {job.id}: {e}")
+            if spec is None:
+                status = CANCELLED if job.status == CANCELLING else FAILED
+                with self.db.engine.begin() as conn:
+                    conn.execute(update(J).where(J.c.id == job.id).values(
+                        status=status, error=f"所属进程 {job.owner} 已退出，任务中断"))
+                continue
+            print(f"接管任务 {job.id}（{job.kind}），原进程 {job.owner} 已退出")
+            if "process" in spec:
+                self._spawn(self._run_chunked, app, job.id, spec["condition"], job.max_id, spec["process"],
+                            spec.get("chunk_size") or self.chunk_size, job.deleted, job.last_id or 0)
+            else:
+                self._spawn(self._run, app, job.id, spec["condition"], job.max_id, spec.get("before_delete"),
+                            spec.get("finish"), spec.get("after"), job.deleted)
+        return handled
@@ -0,0 +1,71 @@
+"""举报去重：提取举报对象并计算去重键
+
+同一个电话号码、网址或 APP 往往被大量用户重复举报，内容措辞各不相同：
+- 从举报内容和来源信息中提取电话号码（手机、座机、400/95 开头的服务号）、网址（只保留域名和路径）
+  和 userwords.txt 中的涉诈平台名称，统一格式后作为举报对象；
+- 有举报对象时，去重键 = 举报类型 + 排好序的举报对象；没有时按归一化后的内容和来源信息计算。
+去重键相同的举报合并到同一条记录上计数。
+"""
+import hashlib
+import re
+
+from fraud_matcher import KeywordMatcher, USERWORDS_PATH, load_wordlist
+from result_cache import normalize_text
+
+_URL_RE = re.compile(
+    r"(?:https?://|www\.)[^\s　-〿＀-￯<>\"']+"
+    r"|\b[a-z0-9][a-z0-9-]*(?:\.[a-z0-9-]+)*\.(?:com|cn|net|org|top|xyz|vip|cc|info|me|io|app|site|shop)"
+    r"(?:/[^\s　-〿＀-￯<>\"']*)?",
+    re.IGNORECASE)
+_PHONE_RE = re.compile(
+    r"(?<!\d)(?:(?:\+?86[\s-]?)?1[3-9]\d(?:[\s-]?\d{4}){2}"       # 手机
+    r"|0\d{2,3}[\s-]?\d{7,8}"                                    # 座机
+    r"|400[\s-]?\d{3}[\s-]?\d{4}|95\d{3,6})(?!\d)")               # 服务号
+_APP_LABEL = "app"
+
+
+def _normalize_url(url: str) -> str:
+    url = re.sub(r"^(?:https?://)?(?:www\.)?", "", url.lower())
+    url = re.split(r"[?#]", url, maxsplit=1)[0]
+    return url.rstrip("/.,;")
+
+
+def _normalize_phone(phone: str) -> str:
+    digits = re.sub(r"\D", "", phone)
+    if len(digits) == 13 and digits.startswith("86") and digits[2] == "1":
+        digits = digits[2:]
+    return digits
+
+
+class ReportDeduper:
+    def __init__(self, app_names=None):
+        names = load_wordlist(USERWORDS_PATH) if app_names is None else list(app_names)
+        self._apps = KeywordMatcher({_APP_LABEL: names}) if names else None
+
+    def extract_targets(self, *texts) -> list:
+        """返回排好序的举报对象，如 ["app:某某金融", "phone:13800138000", "url:abc.cn/x"]"""
+        targets = set()
+        for text in texts:
+            if not text:
+                continue
+            for url in _URL_RE.findall(text):
+                normalized = _normalize_url(url)
+                if normalized:
+                    targets.add(f"url:{normalized}")
+            # 网址中的数字不当作电话号码
+            for phone in _PHONE_RE.findall(_URL_RE.sub(" ", text)):
+                targets.add(f"phone:{_normalize_phone(phone)}")
+            if self._apps is not None:
+                for item in self._apps.scan(text):
+                    targets.update(f"app:{kw}" for kw in item["keywords"])
+        return sorted(targets)
+
+    def report_key(self, report_type: str, content: str, source_info: str = ""):
+        """返回 (去重键, 举报对象列表)"""
+        targets = self.extract_targets(content, source_info)
+        if targets:
+            basis = "\x00".join(targets)
+        else:
+            basis = normalize_text(content or "") + "\x00" + normalize_text(source_info or "")
+        key = hashlib.sha1(f"{report_type}\x00{basis}".encode("utf-8")).hexdigest()
+        return key, targets
@@ -0,0 +1,184 @@
+"""分类结果缓存
+
+同一诈骗模板会几乎原样发给成千上万的用户，这里按“归一化文本”的哈希缓存分类结果：
+空白、标点、数字、网址都被统一替换，改了号码或链接的同模板短信也能命中。
+关键词规则的结果（命中位置、跨空白的关键词）依赖原文，规则路径改用匹配器自己的归一化（只归一大小写）作键。
+
+- 缓存完整的结果（多标签、涉诈平台、各类别概率等字段都保留），以 JSON 文本保存，取出时是独立的副本；
+- 进程内 LRU，带 TTL，按条数和字节数双重限制内存；
+- 可选共享存储（SQLite 文件），多个工作进程之间共享结果；
+- 缓存键带上模型/规则版本，规则或模型一变，旧结果自然失效。
+"""
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+_URL_CHARS = r"[A-Za-z0-9\-._~:/?#@!$&'()*+,;=%]"
+_URL_RE = re.compile(
+    rf"(?:https?://|www\.){_URL_CHARS}+|[a-z0-9-]+(?:\.[a-z0-9-]+)*\.(?:com|cn|net|org|top|xyz|cc|vip|me){_URL_CHARS}*",
+    re.IGNORECASE
+)
+_DIGITS_RE = re.compile(r"\d+")
+
+
+def normalize_text(text: str) -> str:
+    """全角转半角、小写，网址替换为 <url>，连续数字替换为 0，去掉空白和标点符号"""
+    text = unicodedata.normalize("NFKC", text).lower()
+    text = _URL_RE.sub("<url>", text)
+    text = _DIGITS_RE.sub("0", text)
+    return "".join(
+        ch for ch in text
+        if ch in "<>" or unicodedata.category(ch)[0] not in ("P", "S", "Z", "C")
+    )
+
+
+def make_key(version: str, text: str, normalize=normalize_text) -> str:
+    """normalize 决定哪些文本共用一个结果，必须与产生结果的分析方法看到的文本一致"""
+    return hashlib.sha1(f"{version}\x00{normalize(text)}".encode("utf-8")).hexdigest()
+
+
+class SqliteStore:
+    """共享缓存存储：本地 SQLite 文件，多个进程可同时读写"""
+
+    def __init__(self, path: str, cleanup_interval: float = 60):
+        self.path = path
+        self.cleanup_interval = cleanup_interval
+        self._last_cleanup = time.time()
+        self._local = threading.local()
+        self._conn().execute(
+            "CREATE TABLE IF NOT EXISTS result_cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL)"
+        )
+        self._conn().execute("CREATE INDEX IF NOT EXISTS ix_result_cache_expires ON result_cache (expires)")
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        # fork 出的子进程不能沿用父进程的连接
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key: str):
+        row = self._conn().execute(
+            "SELECT value, expires FROM result_cache WHERE key = ? AND expires > ?", (key, time.time())
+        ).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def set(self, key: str, value: str, expires: float):
+        """value 为结果的 JSON 文本；每 cleanup_interval 秒顺带删除一次过期的行，文件不会无限增长"""
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO result_cache (key, value, expires) VALUES (?, ?, ?)",
+            (key, value, expires)
+        )
+        now = time.time()
+        if now - self._last_cleanup > self.cleanup_interval:
+            self._last_cleanup = now
+            conn.execute("DELETE FROM result_cache WHERE expires <= ?", (now,))
+
+    def clear(self):
+        self._conn().execute("DELETE FROM result_cache")
+
+
+class ResultCache:
+    def __init__(self, max_entries: int = 10000, max_bytes: int = 32 * 1024 * 1024,
+                 ttl: float = 3600, store: SqliteStore = None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.store = store
+        self._data = OrderedDict()   # key -> (结果的 JSON 文本, 过期时间, 占用字节)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "shared_hits": 0, "misses": 0, "evictions": 0}
+
+    def get(self, key: str):
+        now = time.time()
+        value = None
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                if entry[1] > now:
+                    self._data.move_to_end(key)
+                    self._stats["hits"] += 1
+                    value = entry[0]
+                else:
+                    self._remove(key)
+        if value is not None:
+            return json.loads(value)
+        if self.store is not None:
+            try:
+                found = self.store.get(key)
+            except sqlite3.Error as e:
+                print("共享缓存读取失败:", e)
+                found = None
+            if found is not None:
+                value, expires = found
+                with self._lock:
+                    self._stats["shared_hits"] += 1
+                    self._insert(key, value, expires)
+                return json.loads(value)
+        with self._lock:
+            self._stats["misses"] += 1
+        return None
+
+    def put(self, key: str, result: dict):
+        value = json.dumps(result, ensure_ascii=False)
+        expires = time.time() + self.ttl
+        with self._lock:
+            self._insert(key, value, expires)
+        if self.store is not None:
+            try:
+                self.store.set(key, value, expires)
+            except sqlite3.Error as e:
+                print("共享缓存写入失败:", e)
+
+    def _insert(self, key, value, expires):
+        if key in self._data:
+            self._remove(key)
+        size = len(key) + len(value.encode("utf-8"))
+        self._data[key] = (value, expires, size)
+        self._bytes += size
+        while self._data and (len(self._data) > self.max_entries or self._bytes > self.max_bytes):
+            self._remove(next(iter(self._data)))
+            self._stats["evictions"] += 1
+
+    def _remove(self, key):
+        _, _, size = self._data.pop(key)
+        self._bytes -= size
+
+    def flush(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+        if self.store is not None:
+            self.store.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            data = dict(self._stats)
+            data.update(entries=len(self._data), bytes=self._bytes,
+                        max_entries=self.max_entries, max_bytes=self.max_bytes, ttl=self.ttl)
+        lookups = data["hits"] + data["shared_hits"] + data["misses"]
+        data["hit_ratio"] = round((data["hits"] + data["shared_hits"]) / lookups, 4) if lookups else 0
+        data["shared_store"] = self.store.path if self.store is not None else None
+        return data
+
+
+def create_cache_from_env() -> ResultCache:
+    """按环境变量创建缓存：RESULT_CACHE_SIZE / RESULT_CACHE_MAX_MB / RESULT_CACHE_TTL / RESULT_CACHE_SHARED"""
+    shared = os.getenv("RESULT_CACHE_SHARED")
+    return ResultCache(
+        max_entries=int(os.getenv("RESULT_CACHE_SIZE", "10000")),
+        max_bytes=int(float(os.getenv("RESULT_CACHE_MAX_MB", "32")) * 1024 * 1024),
+        ttl=float(os.getenv("RESULT_CACHE_TTL", "3600")),
+        store=SqliteStore(shared) if shared else None
+    )
@@ -0,0 +1,220 @@
+"""诈骗规则集版本管理
+
+类别、类别字母和关键词保存在 rule_set 表中，每次修改生成一个新版本（草稿），
+校验通过后由管理员激活，也可以回滚到上一个生效的版本；版本 0 是代码中内置的规则。
+
+当前生效的版本记在只有一行的 rule_pointer 表中，每次激活或回滚都会让 generation 加 1。
+各工作进程最多每 poll_interval 秒读一次这一行（按主键读一个整数），发现 generation 变化时
+才加载新版本、编译成关键词自动机，生成新的只读快照后整体替换引用；
+请求开始时取一次快照并一直使用它，替换过程中的请求不会看到新旧规则混杂的状态。
+"""
+import hashlib
+import json
+import re
+import threading
+import time
+from datetime import datetime
+from types import MappingProxyType
+
+from sqlalchemy import func, insert, select, update
+
+from fraud_matcher import build_matcher
+
+UNKNOWN_CODE = "z"          # 未知类别的编号字母，规则中不能使用
+DRAFT, ACTIVE, RETIRED = "draft", "active", "retired"
+_CODE_RE = re.compile(r"^[a-y]$")
+
+
+class RuleValidationError(ValueError):
+    def __init__(self, errors):
+        super().__init__("；".join(errors))
+        self.errors = errors
+
+
+def validate_rules(categories):
+    """校验并规范化规则，返回 ([{name, code, keywords}], 警告列表)；不合法时抛出 RuleValidationError
+
+    categories 可以是 [{"name", "code", "keywords"}] 列表，也可以是 {类别名: {"code", "keywords"}}，
+    列表顺序即类别优先级（命中数相同时靠前者优先）。
+    """
+    if isinstance(categories, dict):
+        categories = [dict(value, name=name) if isinstance(value, dict) else {"name": name, "keywords": value}
+                      for name, value in categories.items()]
+    if not isinstance(categories, list) or not categories:
+        raise RuleValidationError(["categories 应为非空列表"])
+    errors, warnings, result = [], [], []
+    names, codes, owner = set(), set(), {}
+    for i, item in enumerate(categories):
+        if not isinstance(item, dict):
+            errors.append(f"第 {i + 1} 项应为对象")
+            continue
+        name = str(item.get("name") or "").strip()
+        code = str(item.get("code") or "").strip()
+        keywords = item.get("keywords")
+        if not name or len(name) > 64:
+            errors.append(f"第 {i + 1} 项类别名为空或超过 64 个字符")
+        elif name in names:
+            errors.append(f"类别名重复：{name}")
+        if not _CODE_RE.match(code):
+            errors.append(f"类别“{name}”的字母应为 a~y 中的一个小写字母（{UNKNOWN_CODE} 保留给未知类别）")
+        elif code in codes:
+            errors.append(f"类别字母重复：{code}")
+        if not isinstance(keywords, list) or not all(isinstance(k, str) for k in keywords):
+            errors.append(f"类别“{name}”的 keywords 应为字符串列表")
+            keywords = []
+        cleaned = []
+        for kw in keywords:
+            kw = kw.strip()
+            if kw and kw not in cleaned:
+                cleaned.append(kw)
+        if not cleaned:
+            errors.append(f"类别“{name}”没有关键词")
+        for kw in cleaned:
+            if len(kw) == 1:
+                warnings.append(f"类别“{name}”的关键词“{kw}”只有一个字，容易误判")
+            if kw in owner and owner[kw] != name:
+                warnings.append(f"关键词“{kw}”同时属于“{owner[kw]}”和“{name}”")
+            owner.setdefault(kw, name)
+        names.add(name)
+        codes.add(code)
+        result.append({"name": name, "code": code, "keywords": cleaned})
+    if errors:
+        raise RuleValidationError(errors)
+    return result, warnings
+
+
+class RuleSnapshot:
+    """编译好的一版规则（只读）：类别顺序、类别 -> 字母、关键词自动机"""
+
+    __slots__ = ("version", "generation", "categories", "category_code", "matcher", "fingerprint")
+
+    def __init__(self, version: int, categories: list, generation: int = 0):
+        self.version = version
+        self.generation = generation
+        self.categories = MappingProxyType({c["name"]: tuple(c["keywords"]) for c in categories})
+        self.category_code = MappingProxyType({c["name"]: c["code"] for c in categories})
+        self.matcher = build_matcher(self.categories)
+        # 结果缓存的版本号：按顺序包含 (类别, 字母, 关键词) 和匹配器（含词库），类别顺序变了也会变
+        self.fingerprint = hashlib.sha1(json.dumps(
+            [self.matcher.fingerprint] + [[c["name"], c["code"], list(c["keywords"])] for c in categories],
+            ensure_ascii=False).encode("utf-8")).hexdigest()[:12]
+
+    def as_list(self) -> list:
+        return [{"name": name, "code": self.category_code[name], "keywords": list(kws)}
+                for name, kws in self.categories.items()]
+
+
+class RuleRegistry:
+    def __init__(self, get_engine, rule_table, pointer_table, builtin_categories: dict, builtin_codes: dict,
+                 poll_interval: float = 1.0):
+        # rule_table: rule_set 表；pointer_table: rule_pointer 表；get_engine: 返回 Engine 的函数
+        self._get_engine = get_engine
+        self.rules = rule_table
+        self.pointer = pointer_table
+        self.poll_interval = poll_interval
+        self.builtin = [{"name": name, "code": builtin_codes[name], "keywords": list(kws)}
+                        for name, kws in builtin_categories.items()]
+        self._snapshot = RuleSnapshot(0, self.builtin)
+        self._checked = 0.0
+        self._compile_lock = threading.Lock()
+        self._last_error = None
+
+    # ---------------- 读取当前规则 ----------------
+    def current(self) -> RuleSnapshot:
+        """当前生效的规则快照；距上次检查超过 poll_interval 秒时读一次版本计数器"""
+        now = time.monotonic()
+        if now - self._checked >= self.poll_interval:
+            self._checked = now
+            self.refresh()
+        return self._snapshot
+
+    def refresh(self, force: bool = False):
+        # 其他线程正在编译新版本时直接返回，继续使用旧快照
+        if not self._compile_lock.acquire(blocking=force):
+            return
+        try:
+            with self._get_engine().connect() as conn:
+                row = conn.execute(select(self.pointer.c.version, self.pointer.c.generation)
+                                   .where(self.pointer.c.id == 1)).first()
+                version, generation = (row.version, row.generation) if row else (0, 0)
+                if generation == self._snapshot.generation and version == self._snapshot.version:
+                    return
+                categories = self.builtin if version == 0 else json.loads(conn.execute(
+                    select(self.rules.c.categories).where(self.rules.c.version == version)).scalar_one())
+            self._snapshot = RuleSnapshot(version, categories, generation)
+            self._last_error = None
+        except Exception as e:
+            # 表不存在、数据库不可用或规则损坏时保留旧快照
+            self._last_error = f"{type(e).__name__}: {e}"
+            print("加载规则集失败，继续使用当前版本:", e)
+        finally:
+            self._compile_lock.release()
+
+    def load(self, version: int) -> list:
+        """某个版本的规则列表；版本不存在时返回 None"""
+        if version == 0:
+            return self.builtin
+        with self._get_engine().connect() as conn:
+            data = conn.execute(select(self.rules.c.categories).where(self.rules.c.version == version)).scalar()
+        return json.loads(data) if data is not None else None
+
+    # ---------------- 管理 ----------------
+    def create(self, categories, note: str = None, created_by: str = None):
+        """校验后保存为新的草稿版本，返回 (版本号, 警告)"""
+        rules, warnings = validate_rules(categories)
+        RuleSnapshot(-1, rules)  # 能编译才保存
+        t = self.rules
+        with self._get_engine().begin() as conn:
+            version = (conn.execute(select(func.max(t.c.version))).scalar() or 0) + 1
+            conn.execute(insert(t).values(
+                version=version, status=DRAFT, categories=json.dumps(rules, ensure_ascii=False),
+                note=note, created_by=created_by, created_at=datetime.now()))
+        return version, warnings
+
+    def activate(self, version: int) -> RuleSnapshot:
+        """把某个版本设为生效版本（0 为内置规则）；本进程立即切换，其他进程在 poll_interval 内切换"""
+        t, p = self.rules, self.pointer
+        with self._get_engine().begin() as conn:
+            if version != 0 and conn.execute(select(t.c.version).where(t.c.version == version)).first() is None:
+                raise KeyError(version)
+            updated = conn.execute(update(p).where(p.c.id == 1).values(
+                previous_version=p.c.version, version=version, generation=p.c.generation + 1,
+                updated_at=datetime.now())).rowcount
+            if not updated:
+                conn.execute(insert(p).values(id=1, version=version, previous_version=0, generation=1,
+                                              updated_at=datetime.now()))
+            conn.execute(update(t).where(t.c.status == ACTIVE, t.c.version != version).values(status=RETIRED))
+            if version != 0:
+                conn.execute(update(t).where(t.c.version == version).values(status=ACTIVE, activated_at=datetime.now()))
+        self.refresh(force=True)
+        return self._snapshot
+
+    def rollback(self) -> RuleSnapshot:
+        """回到上一个生效的版本"""
+        with self._get_engine().connect() as conn:
+            previous = conn.execute(select(self.pointer.c.previous_version)
+                                    .where(self.pointer.c.id == 1)).scalar()
+        if previous is None:
+            raise LookupError("没有可回滚的版本")
+        return self.activate(previous)
+
+    def versions(self) -> list:
+        t = self.rules
+        with self._get_engine().connect() as conn:
+            rows = conn.execute(select(t.c.version, t.c.status, t.c.note, t.c.created_by, t.c.created_at,
+                                       t.c.activated_at, t.c.categories).order_by(t.c.version.desc())).fetchall()
+        result = []
+        for row in rows:
+            categories = json.loads(row.categories)
+            result.append({
+                "version": row.version, "status": row.status, "note": row.note, "created_by": row.created_by,
+                "created_at": str(row.created_at), "activated_at": str(row.activated_at) if row.activated_at else None,
+                "categories": len(categories), "keywords": sum(len(c["keywords"]) for c in categories)
+            })
+        return result
+
+    def status(self) -> dict:
+        snap = self._snapshot
+        return {"version": snap.version, "generation": snap.generation, "fingerprint": snap.fingerprint,
+                "categories": len(snap.categories), "keywords": snap.matcher.keyword_count,
+                "poll_interval": self.poll_interval, "last_error": self._last_error}
@@ -0,0 +1,260 @@
+"""短信全文检索（进程内倒排索引）
+
+- 分词：text_lexicon.Tokenizer.index_tokens（三字以上的词典词 + 全部单字和相邻二元组，去停用词），
+  检索词典词的一部分或单个汉字也能命中；
+- 查询：空格分隔表示 AND，竖线 | 分隔表示 OR，如 “退款 客服|快递”；
+  每个词可按 similarity.txt 做同义词扩展；词典外的词按二元组求交集匹配；
+- 排序：BM25 相关度；
+- 增量：每次检索前按 id > 已索引最大 id 拉取新增记录（一次走主键索引的查询），
+  其他工作进程写入的记录也能被追上；
+- 删除：本进程删除或归档的记录由 remove() 移出索引，其他工作进程删除的记录由检索接口
+  按数据库中仍存在的行过滤；倒排表中残留的已删除 id 超过文档数一半时整体压缩一次。
+"""
+import math
+import threading
+import time
+from array import array
+
+from sqlalchemy import select
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+class SearchIndex:
+    def __init__(self, tokenizer, get_engine, table, sync_interval: float = 0.5,
+                 chunk_size: int = 5000, max_results: int = 10000):
+        # table: sms_record 表对象；get_engine: 返回 Engine 的函数
+        self.tokenizer = tokenizer
+        self._get_engine = get_engine
+        self._table = table
+        self.sync_interval = sync_interval
+        self.chunk_size = chunk_size
+        self.max_results = max_results
+        self._postings = {}        # 词 -> (文档 id 数组, 词频数组)，id 递增
+        self._doc_len = {}         # 文档 id -> 词数
+        self._doc_meta = {}        # 文档 id -> (user_id, is_fraud, fraud_type)
+        self._user_docs = {}       # user_id -> 文档 id 数组
+        self._total_len = 0
+        self._stale = 0            # 已移出索引、但仍留在倒排表中的 id 数
+        self.last_id = 0
+        self._last_sync = 0.0
+        self._lock = threading.RLock()
+        self._sync_lock = threading.Lock()
+        self._building = None
+        self.ready = False
+
+    # ---------------- 建索引 ----------------
+    def add(self, doc_id: int, text: str, user_id=None, is_fraud=None, fraud_type=None):
+        tf = {}
+        for token in self.tokenizer.index_tokens(text or ""):
+            tf[token] = tf.get(token, 0) + 1
+        with self._lock:
+            if doc_id <= self.last_id:
+                return
+            for token, count in tf.items():
+                posting = self._postings.get(token)
+                if posting is None:
+                    posting = self._postings[token] = (array("q"), array("H"))
+                posting[0].append(doc_id)
+                posting[1].append(min(count, 65535))
+            length = sum(tf.values())
+            self._doc_len[doc_id] = length
+            self._total_len += length
+            self._doc_meta[doc_id] = (user_id, is_fraud, fraud_type)
+            self._user_docs.setdefault(user_id, array("q")).append(doc_id)
+            self.last_id = max(self.last_id, doc_id)
+
+    def sync(self, force: bool = False) -> int:
+        """拉取 id 大于已索引最大 id 的新记录，返回新增条数"""
+        if not force and time.time() - self._last_sync < self.sync_interval:
+            return 0
+        added = 0
+        with self._sync_lock:
+            t = self._table
+            while True:
+                stmt = (select(t.c.id, t.c.sms_text, t.c.user_id, t.c.is_fraud, t.c.fraud_type)
+                        .where(t.c.id > self.last_id).order_by(t.c.id.asc()).limit(self.chunk_size))
+                with self._get_engine().connect() as conn:
+                    rows = conn.execute(stmt).fetchall()
+                for row in rows:
+                    self.add(row.id, row.sms_text, row.user_id, row.is_fraud, row.fraud_type)
+                added += len(rows)
+                if len(rows) < self.chunk_size:
+                    break
+            self._last_sync = time.time()
+        return added
+
+    def remove(self, ids) -> int:
+        """把已删除或已归档的记录移出索引，返回移出条数"""
+        removed = 0
+        with self._lock:
+            for doc_id in ids:
+                length = self._doc_len.pop(doc_id, None)
+                if length is None:
+                    continue
+                self._total_len -= length
+                self._doc_meta.pop(doc_id, None)
+                removed += 1
+            self._stale += removed
+            if self._stale > len(self._doc_len) // 2:
+                self._compact()
+        return removed
+
+    def _compact(self):
+        """从倒排表和用户文档表中清掉已移出的 id（调用方持有 _lock）"""
+        live = self._doc_len
+        for token in list(self._postings):
+            ids, tfs = self._postings[token]
+            keep = [i for i, doc_id in enumerate(ids) if doc_id in live]
+            if not keep:
+                del self._postings[token]
+            elif len(keep) < len(ids):
+                self._postings[token] = (array("q", (ids[i] for i in keep)), array("H", (tfs[i] for i in keep)))
+        for user_id in list(self._user_docs):
+            docs = array("q", (d for d in self._user_docs[user_id] if d in live))
+            if docs:
+                self._user_docs[user_id] = docs
+            else:
+                del self._user_docs[user_id]
+        self._stale = 0
+
+    def build_in_background(self, app):
+        """首次使用时在后台线程建索引，建好之前检索接口走数据库模糊查询"""
+        with self._lock:
+            if self.ready or self._building is not None:
+                return
+
+            def run():
+                try:
+                    with app.app_context():
+                        self.sync(force=True)
+                    self.ready = True
+                except Exception as e:
+                    print("全文索引构建失败:", e)
+                finally:
+                    self._building = None
+            self._building = threading.Thread(target=run, name="search-index-build", daemon=True)
+            self._building.start()
+
+    def reset(self):
+        with self._lock:
+            self._postings.clear()
+            self._doc_len.clear()
+            self._doc_meta.clear()
+            self._user_docs.clear()
+            self._total_len = 0
+            self._stale = 0
+            self.last_id = 0
+            self._last_sync = 0.0
+            self.ready = False
+
+    # ---------------- 检索 ----------------
+    def _term_postings(self, term: str) -> dict:
+        """单个词（已扩展同义词前）命中的 {文档 id: 词频}"""
+        term = term.lower()
+        posting = self._postings.get(term)
+        if posting is not None:
+            return self._live(posting)
+        # 词典外的词：拆成二元组后求交集，词频取各二元组的最小值
+        grams = self.tokenizer.tokenize(term)
+        if not grams:
+            return {}
+        result = None
+        for gram in grams:
+            posting = self._postings.get(gram)
+            if posting is None:
+                return {}
+            current = self._live(posting)
+            result = current if result is None else {
+                d: min(tf, current[d]) for d, tf in result.items() if d in current
+            }
+            if not result:
+                return {}
+        return result
+
+    def covers(self, query: str) -> bool:
+        """索引能否给出与模糊查询相同的命中：每个汉字和相邻二元组都已收录，查不到即确实没有；
+        停用词、英文数字串的一部分、其他符号不在索引中，含有这些的查询由检索接口改走数据库模糊查询"""
+        stopwords = self.tokenizer.stopwords
+        for word in (w.strip().lower() for part in query.split() for w in part.split("|")):
+            if not word:
+                continue
+            segments = self.tokenizer.segments(word)
+            if sum(len(seg) for seg in segments) != len(word):
+                return False
+            for seg in segments:
+                if seg[0] >= "一":
+                    grams = [seg] if len(seg) == 1 else [seg[j:j + 2] for j in range(len(seg) - 1)]
+                    if any(gram in stopwords for gram in grams):
+                        return False
+                else:
+                    with self._lock:
+                        if seg not in self._postings:
+                            return False
+        return True
+
+    def _live(self, posting) -> dict:
+        if not self._stale:
+            return dict(zip(posting[0], posting[1]))
+        live = self._doc_len
+        return {d: tf for d, tf in zip(posting[0], posting[1]) if d in live}
+
+    def _idf(self, df: int) -> float:
+        n = len(self._doc_len)
+        return math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+    def search(self, query: str, fraud_type=None, is_fraud=None, user_ids=(), expand: bool = True) -> tuple:
+        """返回 (按相关度排序的 [文档 id, ...]（最多 max_results 条）, 截断前的命中总数)
+
+        user_ids：用户名匹配到的用户，这些用户的全部记录也算命中（相关度最低）
+        """
+        groups = [g for g in (part.split("|") for part in query.split()) if any(w.strip() for w in g)]
+        with self._lock:
+            avg_len = self._total_len / len(self._doc_len) if self._doc_len else 1
+            scores = None
+            for group in groups:
+                # 一个 OR 组：组内每个词及其同义词命中的文档取并集
+                group_scores = {}
+                for word in (w.strip() for w in group):
+                    if not word:
+                        continue
+                    for term in (self.tokenizer.expand(word) if expand else {word}):
+                        hits = self._term_postings(term)
+                        if not hits:
+                            continue
+                        idf = self._idf(len(hits))
+                        for doc_id, tf in hits.items():
+                            norm = tf + BM25_K1 * (1 - BM25_B + BM25_B * self._doc_len[doc_id] / avg_len)
+                            group_scores[doc_id] = group_scores.get(doc_id, 0.0) + idf * tf * (BM25_K1 + 1) / norm
+                # 组与组之间取交集（AND）
+                if scores is None:
+                    scores = group_scores
+                else:
+                    scores = {d: s + group_scores[d] for d, s in scores.items() if d in group_scores}
+            scores = scores or {}
+            for user_id in user_ids:
+                for doc_id in self._user_docs.get(user_id, ()):
+                    if doc_id in self._doc_meta:
+                        scores.setdefault(doc_id, 0.0)
+            hits = []
+            for doc_id, score in scores.items():
+                _, doc_is_fraud, doc_type = self._doc_meta[doc_id]
+                if fraud_type and doc_type != fraud_type:
+                    continue
+                if is_fraud is not None and bool(doc_is_fraud) != is_fraud:
+                    continue
+                hits.append((score, doc_id))
+        hits.sort(key=lambda x: (-x[0], -x[1]))
+        return [doc_id for _, doc_id in hits[:self.max_results]], len(hits)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "ready": self.ready,
+                "building": self._building is not None,
+                "documents": len(self._doc_len),
+                "terms": len(self._postings),
+                "stale": self._stale,
+                "last_id": self.last_id
+            }
@@ -0,0 +1,171 @@
+"""服务端会话存储
+
+Flask 默认把 session 整体签名后放在 Cookie 里，只要各工作进程密钥一致即可共用；
+这里进一步把会话内容放到服务端，Cookie 中只保存签名后的会话 id：
+- 注销、删除用户时可以真正作废会话，Cookie 也不会随会话内容变大；
+- 存储用本地 SQLite 文件（WAL 模式，多进程可同时读写），单机多进程部署直接可用，
+  多台机器时可换成实现了 load / save / delete 的共享存储（如 Redis）。
+"""
+import os
+import secrets
+import sqlite3
+import threading
+import time
+
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from itsdangerous import BadSignature, Signer
+from werkzeug.datastructures import CallbackDict
+
+
+class ServerSession(CallbackDict, SessionMixin):
+    def __init__(self, initial=None, sid=None, new=False, expires=None):
+        def on_update(self):
+            self.modified = True
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.expires = expires      # 存储中的过期时间戳
+        self.modified = False
+
+
+class SqliteSessionStore:
+    """会话 id -> (序列化内容, 过期时间戳)；连接按线程创建，fork 后自动重连"""
+
+    def __init__(self, path: str, cleanup_interval: float = 600):
+        self.path = path
+        self.cleanup_interval = cleanup_interval
+        self._local = threading.local()
+        self._last_cleanup = 0.0
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS session ("
+                         "sid TEXT PRIMARY KEY, data TEXT NOT NULL, expires REAL NOT NULL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_session_expires ON session (expires)")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = self._local.conn = self._connect()
+            self._local.pid = os.getpid()
+        return conn
+
+    def load(self, sid: str):
+        row = self._conn().execute("SELECT data, expires FROM session WHERE sid = ?", (sid,)).fetchone()
+        if row is None or row[1] < time.time():
+            return None
+        return row
+
+    def save(self, sid: str, data: str, expires: float):
+        self._conn().execute("INSERT OR REPLACE INTO session (sid, data, expires) VALUES (?, ?, ?)",
+                             (sid, data, expires))
+        self._maybe_cleanup()
+
+    def delete(self, sid: str):
+        self._conn().execute("DELETE FROM session WHERE sid = ?", (sid,))
+
+    def _maybe_cleanup(self):
+        now = time.time()
+        if now - self._last_cleanup < self.cleanup_interval:
+            return
+        self._last_cleanup = now
+        self._conn().execute("DELETE FROM session WHERE expires < ?", (now,))
+
+
+class ServerSideSessionInterface(SessionInterface):
+    """Cookie 中保存签名后的会话 id，内容保存在 store 中"""
+    serializer = TaggedJSONSerializer()
+
+    def __init__(self, store):
+        self.store = store
+
+    def _signer(self, app):
+        return Signer(app.secret_key, salt="server-side-session")
+
+    def open_session(self, app, request):
+        if not app.secret_key:
+            return None
+        cookie = request.cookies.get(self.get_cookie_name(app))
+        if cookie:
+            try:
+                sid = self._signer(app).unsign(cookie).decode()
+            except BadSignature:
+                sid = None
+            row = self.store.load(sid) if sid else None
+            if row is not None:
+                return ServerSession(self.serializer.loads(row[0]), sid=sid, expires=row[1])
+        return ServerSession(sid=secrets.token_urlsafe(32), new=True)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        if session.accessed:
+            response.vary.add("Cookie")
+        if not session:
+            # 会话被清空（如注销）：删除服务端记录和 Cookie
+            if session.modified and not session.new:
+                self.store.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path,
+                                       secure=self.get_cookie_secure(app),
+                                       samesite=self.get_cookie_samesite(app),
+                                       httponly=self.get_cookie_httponly(app))
+            return
+        lifetime = app.permanent_session_lifetime.total_seconds()
+        now = time.time()
+        # 未修改的会话只在剩余有效期不到一半时续期，避免每个请求都写存储
+        renew = session.expires is not None and session.expires - now < lifetime / 2
+        if session.modified or renew:
+            self.store.save(session.sid, self.serializer.dumps(dict(session)), now + lifetime)
+        elif not self.should_set_cookie(app, session):
+            return
+        response.set_cookie(
+            name, self._signer(app).sign(session.sid).decode(),
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app),
+            domain=domain, path=path,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app)
+        )
+        response.vary.add("Cookie")
+
+
+def load_secret_key(instance_path: str) -> str:
+    """所有工作进程共用一个密钥：优先取环境变量 SECRET_KEY，
+    否则读取 SECRET_KEY_FILE（默认 instance/secret_key），文件不存在时由第一个进程生成"""
+    key = os.getenv("SECRET_KEY")
+    if key:
+        return key
+    path = os.getenv("SECRET_KEY_FILE", os.path.join(instance_path, "secret_key"))
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            f.write(secrets.token_hex(32))
+        try:
+            # link 在目标已存在时失败，多个进程同时启动也只有一个密钥生效
+            os.link(tmp, path)
+        except FileExistsError:
+            pass
+        finally:
+            os.remove(tmp)
+    with open(path) as f:
+        return f.read().strip()
+
+
+def init_session_store(app):
+    """按 SESSION_BACKEND 配置会话：sqlite（默认，服务端存储）或 cookie（Flask 默认的签名 Cookie）"""
+    backend = app.config.get("SESSION_BACKEND", "sqlite")
+    if backend == "cookie":
+        return
+    if backend != "sqlite":
+        raise ValueError(f"不支持的 SESSION_BACKEND: {backend}")
+    path = app.config.get("SESSION_DB") or os.path.join(app.instance_path, "sessions.db")
+    app.session_interface = ServerSideSessionInterface(SqliteSessionStore(path))
@@ -0,0 +1,134 @@
+"""统计汇总表维护
+
+sms_stat_daily 按 日期 × 诈骗类型 × 是否诈骗 记录条数，在写入/删除 sms_record 的同一个事务里增减，
+/admin/stats 只读这张小表，不再对 sms_record 做 COUNT / GROUP BY，记录再多统计耗时也不变。
+"""
+from collections import Counter
+from datetime import date, datetime
+
+from sqlalchemy import func, delete, insert, select
+
+
+def _as_date(value):
+    """SQLite 的 DATE() 返回字符串，统一转成 date"""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, str):
+        return date.fromisoformat(value[:10])
+    return value
+
+
+def rollup_key(day, fraud_type, is_fraud) -> tuple:
+    return _as_date(day) or date.today(), fraud_type or "", bool(is_fraud)
+
+
+def bump(session, table, deltas):
+    """按 {(日期, 诈骗类型, 是否诈骗): 增量} 更新汇总表（在调用方的事务中执行，不提交）"""
+    rows = [{"day": d, "fraud_type": t, "is_fraud": f, "count": n}
+            for (d, t, f), n in deltas.items() if n]
+    if not rows:
+        return
+    dialect = session.get_bind().dialect.name
+    if dialect == "mysql":
+        from sqlalchemy.dialects.mysql import insert as upsert
+        stmt = upsert(table).values(rows)
+        stmt = stmt.on_duplicate_key_update(count=table.c.count + stmt.inserted["count"])
+    else:
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert as upsert
+        else:
+            from sqlalchemy.dialects.sqlite import insert as upsert
+        stmt = upsert(table).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.day, table.c.fraud_type, table.c.is_fraud],
+            set_={"count": table.c.count + stmt.excluded["count"]}
+        )
+    session.execute(stmt)
+
+
+def deltas_for_insert(rows) -> Counter:
+    """新写入的记录（dict 或带属性的对象）对应的汇总增量，日期取 created_at（未设置时取当天）
+
+    写入时应显式给出 created_at：删除时按库中的 DATE(created_at) 扣减，
+    若由数据库默认值填写，两边的时钟或时区不同会在零点前后记到不同的日期。
+    """
+    deltas = Counter()
+    today = date.today()
+    for row in rows:
+        get = row.get if isinstance(row, dict) else lambda k: getattr(row, k, None)
+        deltas[rollup_key(get("created_at") or today, get("fraud_type"), get("is_fraud"))] += 1
+    return deltas
+
+
+def deltas_for_delete(session, record_table, *conditions) -> Counter:
+    """即将被删除的记录对应的汇总减量（在删除前、同一事务中统计）"""
+    t = record_table
+    rows = session.execute(
+        select(func.date(t.c.created_at), t.c.fraud_type, t.c.is_fraud, func.count())
+        .where(*conditions)
+        .group_by(func.date(t.c.created_at), t.c.fraud_type, t.c.is_fraud)
+    ).fetchall()
+    deltas = Counter()
+    for day, fraud_type, is_fraud, n in rows:
+        deltas[rollup_key(day, fraud_type, is_fraud)] -= n
+    return deltas
+
+
+def rebuild(session, table, record_table) -> int:
+    """按 sms_record 全量重算汇总表（回填或校正用），返回汇总行数"""
+    session.execute(delete(table))
+    deltas = deltas_for_delete(session, record_table)
+    rows = [{"day": d, "fraud_type": t, "is_fraud": f, "count": -n} for (d, t, f), n in deltas.items()]
+    if rows:
+        session.execute(insert(table), rows)
+    return len(rows)
+
+
+def query_stats(session, table, start: date = None, end: date = None, top: int = 1, series: bool = False) -> dict:
+    """从汇总表读取统计：区间内诈骗总数、占比最高的 N 个类型、可选的逐日序列"""
+    t = table
+    conditions = []
+    if start:
+        conditions.append(t.c.day >= start)
+    if end:
+        conditions.append(t.c.day <= end)
+    total_fraud = session.execute(
+        select(func.coalesce(func.sum(t.c.count), 0)).where(t.c.is_fraud == True, *conditions)
+    ).scalar()
+    top_rows = session.execute(
+        select(t.c.fraud_type, func.sum(t.c.count).label("n"))
+        .where(t.c.is_fraud == True, *conditions)
+        .group_by(t.c.fraud_type)
+        .having(func.sum(t.c.count) > 0)
+        .order_by(func.sum(t.c.count).desc())
+        .limit(top)
+    ).fetchall()
+    data = {
+        "total_fraud_records": int(total_fraud),
+        "top_fraud_types": [
+            {"type": fraud_type, "count": int(n),
+             "percentage": round(n / total_fraud * 100, 2) if total_fraud else 0}
+            for fraud_type, n in top_rows
+        ]
+    }
+    if series:
+        rows = session.execute(
+            select(t.c.day, t.c.is_fraud, func.sum(t.c.count))
+            .where(*conditions)
+            .group_by(t.c.day, t.c.is_fraud)
+            .order_by(t.c.day)
+        ).fetchall()
+        days = {}
+        for day, is_fraud, n in rows:
+            item = days.setdefault(_as_date(day).isoformat(), {"total": 0, "fraud": 0})
+            item["total"] += int(n)
+            if is_fraud:
+                item["fraud"] += int(n)
+        data["daily_series"] = [{"day": d, **v} for d, v in days.items()]
+    return data
+
+
+def count_for_day(session, table, day: date) -> int:
+    return int(session.execute(
+        select(func.coalesce(func.sum(table.c.count), 0)).where(table.c.day == day)
+    ).scalar())
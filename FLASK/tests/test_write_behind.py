@@ -0,0 +1,62 @@
+"""异步写入：进程在清空日志之后崩溃，重启时能补写日志中的记录"""
+import glob
+import multiprocessing
+import os
+import sys
+import threading
+
+import pytest
+from flask import Flask
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from write_behind import WriteBehindWriter  # noqa: E402
+
+
+class _FakeDb:
+    class session:
+        @staticmethod
+        def rollback():
+            pass
+
+
+def _crashing_writer(spill_dir):
+    """子进程：第一条记录提交（检查点后日志被清空），第二条记录只进日志，随即崩溃"""
+    written = []
+    blocked = threading.Event()
+
+    def write_batch(rows, replay=False):
+        if written:
+            blocked.set()
+            threading.Event().wait()   # 卡住写入线程，模拟还没来得及写库
+        written.extend(rows)
+
+    writer = WriteBehindWriter(_FakeDb, write_batch, flush_interval=0.01, spill_dir=spill_dir).start(Flask("child"))
+    writer.submit({"case_no": "a00001"})
+    assert writer.flush(5)
+    writer.submit({"case_no": "a00002"})
+    blocked.wait(5)
+    os._exit(0)
+
+
+@pytest.mark.skipif(os.name == "nt", reason="需要 fork")
+def test_record_after_checkpoint_is_recovered(tmp_path):
+    spill_dir = str(tmp_path)
+    child = multiprocessing.get_context("fork").Process(target=_crashing_writer, args=(spill_dir,))
+    child.start()
+    child.join(10)
+    assert child.exitcode == 0
+
+    recovered = []
+
+    def write_batch(rows, replay=False):
+        assert replay
+        recovered.extend(row["case_no"] for row in rows)
+
+    writer = WriteBehindWriter(_FakeDb, write_batch, spill_dir=spill_dir).start(Flask("recover"))
+    try:
+        assert recovered == ["a00002"]
+        # 无主日志补写后删除，只剩新进程自己的日志
+        assert glob.glob(os.path.join(spill_dir, "wb-*.log")) == [writer._journal.name]
+    finally:
+        writer.stop()
@@ -0,0 +1,116 @@
+"""中文分词与词库资源
+
+加载 大创文本识别/ 目录下的三个词表：
+- userwords.txt：自定义词典（涉诈平台/APP 名称），分词时作为整词切出；
+- stopwordslist.txt：停用词，分词结果中去掉；
+- similarity.txt：同义词组，每行一组，逗号分隔。
+
+分词采用“词典正向最大匹配 + 二元切分”：词典里有的词整词切出，
+词典外的连续汉字切成相邻二元组（与 MySQL ngram 全文索引的做法一致），
+英文和数字按连续串切分并转小写。
+全文索引另用 index_tokens()：在分词结果之外再收录每个汉字和全部相邻二元组，
+检索词典词的一部分或单个汉字时也能命中。
+"""
+import os
+import re
+
+from fraud_matcher import LEXICON_DIR, USERWORDS_PATH, load_wordlist
+
+STOPWORDS_PATH = os.path.join(LEXICON_DIR, "stopwordslist.txt")
+SIMILARITY_PATH = os.path.join(LEXICON_DIR, "similarity.txt")
+
+_SEGMENT_RE = re.compile(r"[一-鿿]+|[a-z0-9]+(?:\.[a-z0-9]+)*", re.IGNORECASE)
+
+
+def load_synonym_groups(path: str = SIMILARITY_PATH) -> list:
+    groups = []
+    for line in load_wordlist(path):
+        words = [w.strip() for w in line.split(",") if w.strip()]
+        if len(words) > 1:
+            groups.append(words)
+    return groups
+
+
+class Tokenizer:
+    def __init__(self, words=(), stopwords=(), synonym_groups=()):
+        self.words = {w.lower() for w in words if w}
+        self.stopwords = {w.lower() for w in stopwords if w}
+        self.max_word_len = max((len(w) for w in self.words), default=1)
+        # 同义词：词 -> 所在组的全部词；词 -> 组代表词（组内第一个）
+        self.synonyms = {}
+        self.canonical = {}
+        for group in synonym_groups:
+            lowered = [w.lower() for w in group]
+            for w in lowered:
+                self.synonyms.setdefault(w, set()).update(lowered)
+                self.canonical.setdefault(w, lowered[0])
+            self.words.update(lowered)
+        if self.words:
+            self.max_word_len = max(len(w) for w in self.words)
+
+    def _cut_cjk(self, run: str):
+        """正向最大匹配；词典外的部分切成二元组"""
+        i, n = 0, len(run)
+        pending = ""          # 尚未切分的词典外汉字
+        while i < n:
+            for size in range(min(self.max_word_len, n - i), 1, -1):
+                if run[i:i + size] in self.words:
+                    yield from self._bigrams(pending)
+                    pending = ""
+                    yield run[i:i + size]
+                    i += size
+                    break
+            else:
+                pending += run[i]
+                i += 1
+        yield from self._bigrams(pending)
+
+    @staticmethod
+    def _bigrams(chars: str):
+        if len(chars) == 1:
+            yield chars
+        for j in range(len(chars) - 1):
+            yield chars[j:j + 2]
+
+    def tokenize(self, text: str) -> list:
+        """分词并去掉停用词"""
+        tokens = []
+        for seg in _SEGMENT_RE.findall(text.lower()):
+            if seg[0] >= "一":
+                tokens.extend(t for t in self._cut_cjk(seg) if t not in self.stopwords)
+            elif seg not in self.stopwords:
+                tokens.append(seg)
+        return tokens
+
+    @staticmethod
+    def segments(text: str) -> list:
+        """切出连续的汉字串和英文数字串（已转小写），其余字符丢弃"""
+        return _SEGMENT_RE.findall(text.lower())
+
+    def index_tokens(self, text: str) -> list:
+        """全文索引用：三字以上的词典词整词保留，另加每个汉字和全部相邻二元组（都去掉停用词）"""
+        tokens = []
+        for seg in self.segments(text):
+            if seg[0] >= "一":
+                grams = [t for t in self._cut_cjk(seg) if len(t) > 2]
+                grams.extend(seg)
+                grams.extend(seg[j:j + 2] for j in range(len(seg) - 1))
+                tokens.extend(t for t in grams if t not in self.stopwords)
+            elif seg not in self.stopwords:
+                tokens.append(seg)
+        return tokens
+
+    def expand(self, term: str) -> set:
+        """同义词扩展：返回包括自身在内的同组词"""
+        term = term.lower()
+        return set(self.synonyms.get(term, ())) | {term}
+
+    def normalize(self, tokens) -> list:
+        """把同义词统一替换为组代表词"""
+        return [self.canonical.get(t, t) for t in tokens]
+
+
+def build_tokenizer(extra_words=()) -> Tokenizer:
+    """用 userwords.txt、stopwordslist.txt、similarity.txt 和额外词表（如诈骗关键词）构造分词器"""
+    words = load_wordlist(USERWORDS_PATH) + list(extra_words)
+    return Tokenizer(words, load_wordlist(STOPWORDS_PATH), load_synonym_groups())
@@ -0,0 +1,306 @@
+"""分析记录异步写入（write-behind）
+
+analyze_text 拿到分类结果和案件编号后即可返回，记录行交给本模块：
+- 有界队列：submit() 在队列满时最多等待 put_timeout 秒，仍满则返回 False，
+  由调用方改为同步写库（背压：写库跟不上时请求自然变慢，而不是无限堆积内存）；
+- 后台写入线程：攒够 batch_size 条或等待 flush_interval 秒后，一次多行插入、一次提交；
+  单批失败时若是数据冲突则逐条写入并丢弃有问题的行，若是数据库不可用则退避重试；
+- 落盘日志：每行入队的同时追加到本进程的日志文件（wb-<pid>-<启动时间>-<随机串>.log，每次启动一个新文件，
+  容器重启后 pid 重复也不会撞名），提交后写检查点（同名 .ckpt）；日志文件持有排他锁期间才会写入，
+  进程崩溃后，下次启动的任一进程会接管无主日志（能加上锁的），把检查点之后的记录补写入库（按案件编号去重），
+  删除也在持有锁时进行；
+- 进程退出（atexit）时把队列中剩余的记录写完。
+"""
+import atexit
+import glob
+import json
+import os
+import threading
+import time
+import uuid
+from datetime import datetime
+from queue import Queue, Empty, Full
+
+from sqlalchemy.exc import IntegrityError
+
+_STOP = object()
+
+
+def _try_lock(f) -> bool:
+    """对日志文件加非阻塞排他锁；进程退出后锁自动释放，据此判断日志是否无主"""
+    try:
+        if os.name == "nt":
+            import msvcrt
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return True
+    except OSError:
+        return False
+
+
+class WriteBehindWriter:
+    def __init__(self, db, write_batch, max_queue: int = 10000, batch_size: int = 500,
+                 flush_interval: float = 0.2, spill_dir: str = None, fsync: bool = False,
+                 put_timeout: float = 0.5, datetime_fields=("created_at",)):
+        # write_batch(rows, replay=False)：在应用上下文中写入并提交一批记录（replay 时需跳过已入库的行）
+        self.db = db
+        self._write_batch = write_batch
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.spill_dir = spill_dir
+        self.fsync = fsync
+        self.put_timeout = put_timeout
+        self.datetime_fields = datetime_fields
+        self._app = None
+        self._thread = None
+        self._init_state()
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def _init_state(self):
+        self._queue = Queue(self.max_queue)
+        self._submit_lock = threading.Lock()
+        self._done = threading.Condition()
+        self._seq = 0               # 最后一个入队的序号
+        self._committed = 0         # 已提交的最大序号（队列先进先出，已提交的总是前缀）
+        self._journal = None
+        self._stats = {"submitted": 0, "rejected": 0, "written": 0, "batches": 0,
+                       "dropped": 0, "retries": 0, "recovered": 0}
+        self._last_error = None
+
+    # ---------------- 对外接口 ----------------
+    def start(self, app):
+        """补写无主日志，打开本进程日志并启动写入线程"""
+        self._app = app
+        if self.spill_dir:
+            os.makedirs(self.spill_dir, exist_ok=True)
+            self._recover()
+            self._open_journal()
+        self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+        return self
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def submit(self, row: dict) -> bool:
+        """记录入队（并写入日志）；队列满或写入线程未运行时返回 False，调用方应同步写库"""
+        if not self.running:
+            return False
+        with self._submit_lock:
+            seq = self._seq + 1
+            try:
+                self._queue.put((seq, row), timeout=self.put_timeout)
+            except Full:
+                self._stats["rejected"] += 1
+                return False
+            self._seq = seq
+            self._stats["submitted"] += 1
+            if self._journal is not None:
+                self._journal.write(json.dumps({"seq": seq, "row": row}, ensure_ascii=False, default=str) + "\n")
+                self._journal.flush()
+                if self.fsync:
+                    os.fsync(self._journal.fileno())
+        return True
+
+    def flush(self, timeout: float = 10.0) -> bool:
+        """等待此前入队的记录全部提交，超时返回 False"""
+        target = self._seq
+        deadline = time.monotonic() + timeout
+        with self._done:
+            while self._committed < target:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self.running:
+                    return self._committed >= target
+                self._done.wait(remaining)
+        return True
+
+    def stop(self, timeout: float = 10.0):
+        """写完队列中剩余记录后停止写入线程（进程退出时自动调用）"""
+        if not self.running:
+            return
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except Full:
+            pass
+        self._thread.join(timeout)
+
+    def stats(self) -> dict:
+        data = dict(self._stats)
+        data.update(queue_depth=self._queue.qsize(), max_queue=self.max_queue, running=self.running,
+                    pending=self._seq - self._committed, last_error=self._last_error,
+                    spill_dir=self.spill_dir)
+        return data
+
+    # ---------------- 写入线程 ----------------
+    def _run(self):
+        while True:
+            try:
+                item = self._queue.get(timeout=1.0)
+            except Empty:
+                continue
+            if item is _STOP:
+                return
+            batch = [item]
+            stop = False
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except Empty:
+                    break
+                if item is _STOP:
+                    stop = True
+                    break
+                batch.append(item)
+            if not self._write(batch, stopping=stop):
+                return
+            self._checkpoint(batch[-1][0])
+            if stop:
+                # 队列在 _STOP 之后不会再有记录被处理，剩余的留在日志中由下次启动补写
+                return
+
+    def _write(self, batch, stopping=False) -> bool:
+        """写入一批记录；数据库不可用时退避重试，返回 False 表示放弃（记录保留在日志中）"""
+        rows = [row for _, row in batch]
+        delay = 0.5
+        while True:
+            with self._app.app_context():
+                try:
+                    self._write_batch(rows)
+                    self._stats["batches"] += 1
+                    self._stats["written"] += len(rows)
+                    return True
+                except IntegrityError as e:
+                    self._rollback()
+                    self._last_error = str(e)[:500]
+                    self._write_one_by_one(rows)
+                    return True
+                except Exception as e:
+                    self._rollback()
+                    self._last_error = str(e)[:500]
+                    print("异步写入失败，稍后重试:", e)
+            if stopping and delay > 4:
+                return False
+            self._stats["retries"] += 1
+            time.sleep(delay)
+            delay = min(delay * 2, 30)
+
+    def _write_one_by_one(self, rows):
+        for row in rows:
+            try:
+                self._write_batch([row])
+                self._stats["written"] += 1
+            except Exception as e:
+                self._rollback()
+                self._stats["dropped"] += 1
+                print(f"异步写入丢弃记录 {row.get('case_no')}: {e}")
+
+    def _rollback(self):
+        self.db.session.rollback()
+
+    def _checkpoint(self, seq: int):
+        with self._done:
+            self._committed = seq
+            self._done.notify_all()
+        if self._journal is None:
+            return
+        path = self._journal.name[:-len(".log")] + ".ckpt"
+        with open(path + ".tmp", "w") as f:
+            f.write(str(seq))
+        os.replace(path + ".tmp", path)
+        # 全部提交且没有新记录时清空日志，防止文件无限增长
+        with self._submit_lock:
+            if self._committed == self._seq:
+                self._journal.truncate(0)
+                self._journal.seek(0)   # truncate 不移动写入位置，不回到开头的话下一行前面会留下一段 NUL
+
+    # ---------------- 日志与恢复 ----------------
+    def _open_journal(self):
+        """新建本进程专用的日志文件并加锁；加不上锁（被正在补写的进程抢先锁住）就换一个名字，都失败则不写日志"""
+        self._journal = None
+        for _ in range(3):
+            name = f"wb-{os.getpid()}-{time.time_ns():x}-{uuid.uuid4().hex[:8]}.log"
+            f = open(os.path.join(self.spill_dir, name), "x", encoding="utf-8")  # 只用自己新建的文件
+            if _try_lock(f):
+                self._journal = f
+                return
+            f.close()   # 文件归加锁的一方处理，这里不删除
+        self._last_error = "无法锁定异步写入日志文件，本进程不写日志（崩溃时排队中的记录会丢失）"
+        print(self._last_error)
+
+    def _decode(self, row: dict) -> dict:
+        for field in self.datetime_fields:
+            if isinstance(row.get(field), str):
+                row[field] = datetime.fromisoformat(row[field])
+        return row
+
+    def _recover(self):
+        """接管已退出进程留下的日志，补写检查点之后的记录"""
+        own = self._journal.name if self._journal is not None else None
+        for path in sorted(glob.glob(os.path.join(self.spill_dir, "wb-*.log"))):
+            if own is not None and os.path.samefile(path, own):
+                continue
+            try:
+                f = open(path, "r+", encoding="utf-8")
+            except FileNotFoundError:
+                continue  # 已被其他进程补写并删除
+            with f:
+                if not _try_lock(f):
+                    continue  # 所属进程仍在运行，或另一个进程正在补写
+                ckpt_path = path[:-len(".log")] + ".ckpt"
+                try:
+                    with open(ckpt_path) as c:
+                        committed = int(c.read().strip() or 0)
+                except (OSError, ValueError):
+                    committed = 0
+                rows = []
+                for line in f:
+                    try:
+                        entry = json.loads(line.lstrip("\0"))  # 旧版本清空日志后留下的 NUL 前缀
+                    except ValueError:
+                        continue  # 崩溃时写了一半的行
+                    if entry["seq"] > committed:
+                        rows.append(self._decode(entry["row"]))
+                for start in range(0, len(rows), self.batch_size):
+                    chunk = rows[start:start + self.batch_size]
+                    with self._app.app_context():
+                        try:
+                            self._write_batch(chunk, replay=True)
+                        except Exception as e:
+                            self._rollback()
+                            print(f"补写日志 {path} 失败，保留文件待下次启动: {e}")
+                            break
+                    self._stats["recovered"] += len(chunk)
+                else:
+                    if rows:
+                        print(f"已从 {path} 补写 {len(rows)} 条记录")
+                    self._discard(f, path, ckpt_path)
+
+    @staticmethod
+    def _discard(f, path, ckpt_path):
+        """删除已补写完的日志和检查点（持有日志锁时删除；Windows 不能删除打开着的文件，先关闭再删）"""
+        if os.name == "nt":
+            f.close()
+        for p in (ckpt_path, path):
+            try:
+                os.remove(p)
+            except FileNotFoundError:
+                pass
+
+    def _after_fork(self):
+        """应用在 fork 之前启动了写入线程时，子进程重新初始化并使用自己的日志"""
+        app, was_running = self._app, self._thread is not None
+        self._init_state()
+        self._thread = None
+        if app is not None and was_running:
+            if self.spill_dir:
+                self._open_journal()
+            self._app = app
+            self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+            self._thread.start()
@@ -0,0 +1,11 @@
+"""生产环境入口
+
+Linux（多进程 + 多线程）：  gunicorn -c gunicorn.conf.py wsgi:app
+Windows（单进程多线程）：   waitress-serve --listen=0.0.0.0:5000 --threads=16 wsgi:app
+"""
+import importlib
+
+# 主程序文件名带连字符，不能直接 import
+create_app = importlib.import_module("myflask_8-1").create_app
+
+app = create_app()
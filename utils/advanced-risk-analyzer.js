@@ -1,11 +1,12 @@
 /**
  * @name advanced-risk-analyzer.js
- * @description 高级风险分析引擎（接口 & 模拟实现）
+ * @description 高级风险分析引擎
  * 职责：接收短信，进行深度分析，并返回详细的风险报告。
- * 这是为您的团队预留的接口。
+ * 结论来自服务端（增量同步，见 inbox-sync.js），服务端不可用时使用本地模拟规则。
  */
 
 import alertManager from './alert-manager.js'; // 引入预警管理器
+import inboxSync from './inbox-sync.js'; // 收件箱增量同步
 
 // 模拟的关键词和风险类型映射
 const MOCK_RISK_PATTERNS = {
@@ -20,8 +21,43 @@ const MOCK_RISK_TYPES = {
 	'低风险': ['营销推广']
 };
 
+/**
+ * 本地模拟分析（服务端不可用时的兜底）
+ * @param {Object} sms
+ * @returns {Object|null} 风险结果，没有风险时返回 null
+ */
+function analyzeLocally(sms) {
+	const lowerBody = (sms.body || '').toLowerCase();
+	let riskLevel = null;
+
+	// 根据关键词匹配风险
+	if (MOCK_RISK_PATTERNS['高风险'].some(p => lowerBody.includes(p))) {
+		riskLevel = 'high';
+	} else if (MOCK_RISK_PATTERNS['中风险'].some(p => lowerBody.includes(p))) {
+		riskLevel = 'medium';
+	} else if (MOCK_RISK_PATTERNS['低风险'].some(p => lowerBody.includes(p))) {
+		riskLevel = 'low';
+	}
+
+	// 如果识别出风险，构建返回结果
+	if (riskLevel) {
+		const riskType = MOCK_RISK_TYPES[riskLevel === 'high' ? '高风险' : riskLevel === 'medium' ? '中风险' : '低风险'][0] || '未知类型';
+		
+		// 合并原短信信息和分析结果
+		return {
+			...sms, // 包含 id, sender, body, date
+			riskLevel: riskLevel,
+			riskType: riskType,
+			suggestion: `[模拟建议] 此消息被判定为${riskType}，请谨慎处理。`
+		};
+	}
+	return null; // 如果没有风险，返回null
+}
+
 /**
  * 【接口】分析短信的风险
+ * 先通过 inbox-sync 增量同步取服务端结论（只上传服务端没见过的短信），
+ * 未登录或网络不可用时退回本地模拟分析。
  * @param {Array<Object>} messages - 需要分析的短信对象数组
  * @param {string} messages[].id - 短信的唯一ID
  * @param {string} messages[].sender - 发件人
@@ -30,43 +66,35 @@ const MOCK_RISK_TYPES = {
  * @returns {Promise<Array<Object>>} 一个Promise，解析后返回风险结果数组
  */
 async function analyze(messages) {
-	// 1. 模拟网络请求延迟
 	console.log('[高级分析引擎] 接收到分析任务:', messages);
-	await new Promise(resolve => setTimeout(resolve, 1500)); // 模拟1.5秒的分析耗时
 
-	const results = messages.map(sms => {
-		// 1.5. 新增：白名单检查
+	// 白名单中的发件人跳过分析
+	const targets = messages.filter(sms => {
 		if (alertManager.isSenderInSafelist(sms.sender)) {
 			console.log(`[高级分析引擎] 发件人 ${sms.sender} 在白名单中，跳过分析。`);
-			return null;
+			return false;
 		}
+		return true;
+	});
 
-		const lowerBody = sms.body.toLowerCase();
-		let riskLevel = null;
-
-		// 2. 模拟分析逻辑：根据关键词匹配风险
-		if (MOCK_RISK_PATTERNS['高风险'].some(p => lowerBody.includes(p))) {
-			riskLevel = 'high';
-		} else if (MOCK_RISK_PATTERNS['中风险'].some(p => lowerBody.includes(p))) {
-			riskLevel = 'medium';
-		} else if (MOCK_RISK_PATTERNS['低风险'].some(p => lowerBody.includes(p))) {
-			riskLevel = 'low';
-		}
-
-		// 3. 如果识别出风险，构建返回结果
-		if (riskLevel) {
-			const riskType = MOCK_RISK_TYPES[riskLevel === 'high' ? '高风险' : riskLevel === 'medium' ? '中风险' : '低风险'][0] || '未知类型';
-			
-			// 合并原短信信息和分析结果
-			return {
-				...sms, // 包含 id, sender, body, date
-				riskLevel: riskLevel,
-				riskType: riskType,
-				suggestion: `[模拟建议] 此消息被判定为${riskType}，请谨慎处理。`
-			};
-		}
+	let verdicts = null;
+	try {
+		verdicts = await inboxSync.sync(targets);
+	} catch (e) {
+		console.log('[高级分析引擎] 服务端同步失败，使用本地分析:', e);
+	}
 
-		return null; // 如果没有风险，返回null
+	const results = targets.map(sms => {
+		const verdict = verdicts && inboxSync.verdictFor(verdicts, sms);
+		if (!verdict) return analyzeLocally(sms);
+		if (!verdict['是否诈骗']) return null;
+		return {
+			...sms,
+			riskLevel: 'high',
+			riskType: verdict['诈骗类别'],
+			caseNo: verdict['编号'],
+			suggestion: verdict['诈骗信息'] || `此消息被判定为${verdict['诈骗类别']}，请勿转账或透露个人信息。`
+		};
 	}).filter(Boolean); // 过滤掉没有风险的结果 (null)
 
 	console.log('[高级分析引擎] 分析完成，返回结果:', results);
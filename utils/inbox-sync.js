@@ -0,0 +1,172 @@
+/**
+ * @name inbox-sync.js
+ * @description 收件箱增量同步（对应后端 /sms/sync 与 /sms/sync/upload）。
+ * 职责：只上传短信内容的哈希，本人在当前规则下已分析过的直接取回结论，其余短信才上传全文。
+ * 收件箱和规则都没变时只发一个摘要，服务端按主键读一行即可返回。
+ */
+import config from './config.js';
+
+const HASH_LEN = 32; // SHA-256 取前 128 位，十六进制 32 位
+const VERDICT_KEY = 'inboxVerdicts'; // 本地缓存的结论 { 哈希: { 编号, 诈骗类别, 是否诈骗, 诈骗信息 } }
+const DIGEST_KEY = 'inboxSyncDigest'; // 上次完整同步时的收件箱摘要
+
+const K = [
+	0x428a2f98, 0x71374491, 0xb5c0fbcf, 0xe9b5dba5, 0x3956c25b, 0x59f111f1, 0x923f82a4, 0xab1c5ed5,
+	0xd807aa98, 0x12835b01, 0x243185be, 0x550c7dc3, 0x72be5d74, 0x80deb1fe, 0x9bdc06a7, 0xc19bf174,
+	0xe49b69c1, 0xefbe4786, 0x0fc19dc6, 0x240ca1cc, 0x2de92c6f, 0x4a7484aa, 0x5cb0a9dc, 0x76f988da,
+	0x983e5152, 0xa831c66d, 0xb00327c8, 0xbf597fc7, 0xc6e00bf3, 0xd5a79147, 0x06ca6351, 0x14292967,
+	0x27b70a85, 0x2e1b2138, 0x4d2c6dfc, 0x53380d13, 0x650a7354, 0x766a0abb, 0x81c2c92e, 0x92722c85,
+	0xa2bfe8a1, 0xa81a664b, 0xc24b8b70, 0xc76c51a3, 0xd192e819, 0xd6990624, 0xf40e3585, 0x106aa070,
+	0x19a4c116, 0x1e376c08, 0x2748774c, 0x34b0bcb5, 0x391c0cb3, 0x4ed8aa4a, 0x5b9cca4f, 0x682e6ff3,
+	0x748f82ee, 0x78a5636f, 0x84c87814, 0x8cc70208, 0x90befffa, 0xa4506ceb, 0xbef9a3f7, 0xc67178f2
+];
+
+// 按 UTF-8 编码；孤立的代理项按 U+FFFD 编码（与后端 inbox_sync.py 一致）
+function utf8Bytes(str) {
+	const bytes = [];
+	for (let i = 0; i < str.length; i++) {
+		let c = str.charCodeAt(i);
+		if (c >= 0xd800 && c <= 0xdbff && i + 1 < str.length) {
+			const d = str.charCodeAt(i + 1);
+			if (d >= 0xdc00 && d <= 0xdfff) {
+				c = 0x10000 + ((c - 0xd800) << 10) + (d - 0xdc00);
+				i++;
+			}
+		}
+		if (c >= 0xd800 && c <= 0xdfff) c = 0xfffd;
+		if (c < 0x80) bytes.push(c);
+		else if (c < 0x800) bytes.push(0xc0 | (c >> 6), 0x80 | (c & 63));
+		else if (c < 0x10000) bytes.push(0xe0 | (c >> 12), 0x80 | ((c >> 6) & 63), 0x80 | (c & 63));
+		else bytes.push(0xf0 | (c >> 18), 0x80 | ((c >> 12) & 63), 0x80 | ((c >> 6) & 63), 0x80 | (c & 63));
+	}
+	return bytes;
+}
+
+/**
+ * SHA-256（小程序和 App 端没有统一可用的 crypto.subtle，这里用纯 JS 实现）
+ * @param {string} str
+ * @returns {string} 64 位十六进制
+ */
+function sha256(str) {
+	const bytes = utf8Bytes(str);
+	const bitLen = bytes.length * 8;
+	bytes.push(0x80);
+	while (bytes.length % 64 !== 56) bytes.push(0);
+	const hi = Math.floor(bitLen / 4294967296);
+	bytes.push(hi >>> 24, (hi >>> 16) & 255, (hi >>> 8) & 255, hi & 255,
+		bitLen >>> 24, (bitLen >>> 16) & 255, (bitLen >>> 8) & 255, bitLen & 255);
+	const h = [0x6a09e667, 0xbb67ae85, 0x3c6ef372, 0xa54ff53a, 0x510e527f, 0x9b05688c, 0x1f83d9ab, 0x5be0cd19];
+	const w = new Array(64);
+	for (let off = 0; off < bytes.length; off += 64) {
+		for (let i = 0; i < 16; i++) {
+			const j = off + i * 4;
+			w[i] = (bytes[j] << 24) | (bytes[j + 1] << 16) | (bytes[j + 2] << 8) | bytes[j + 3];
+		}
+		for (let i = 16; i < 64; i++) {
+			const a = w[i - 15], b = w[i - 2];
+			const s0 = ((a >>> 7) | (a << 25)) ^ ((a >>> 18) | (a << 14)) ^ (a >>> 3);
+			const s1 = ((b >>> 17) | (b << 15)) ^ ((b >>> 19) | (b << 13)) ^ (b >>> 10);
+			w[i] = (w[i - 16] + s0 + w[i - 7] + s1) | 0;
+		}
+		let [a, b, c, d, e, f, g, k] = h;
+		for (let i = 0; i < 64; i++) {
+			const S1 = ((e >>> 6) | (e << 26)) ^ ((e >>> 11) | (e << 21)) ^ ((e >>> 25) | (e << 7));
+			const t1 = (k + S1 + ((e & f) ^ (~e & g)) + K[i] + w[i]) | 0;
+			const S0 = ((a >>> 2) | (a << 30)) ^ ((a >>> 13) | (a << 19)) ^ ((a >>> 22) | (a << 10));
+			const t2 = (S0 + ((a & b) ^ (a & c) ^ (b & c))) | 0;
+			k = g; g = f; f = e; e = (d + t1) | 0;
+			d = c; c = b; b = a; a = (t1 + t2) | 0;
+		}
+		[a, b, c, d, e, f, g, k].forEach((v, i) => { h[i] = (h[i] + v) | 0; });
+	}
+	return h.map(v => (v >>> 0).toString(16).padStart(8, '0')).join('');
+}
+
+// 短信内容的哈希（与后端 text_hash 相同）
+function hashText(text) {
+	return sha256(text).slice(0, HASH_LEN);
+}
+
+// 哈希集合的摘要：排序去重后用逗号连接再哈希一次
+function digestOf(hashes) {
+	return hashText(Array.from(new Set(hashes)).sort().join(','));
+}
+
+function post(path, data) {
+	return new Promise((resolve, reject) => {
+		uni.request({
+			url: `${config.BASE_URL}${path}`,
+			method: 'POST',
+			data,
+			success: (res) => {
+				if (res.statusCode === 200) resolve(res.data);
+				else reject(new Error((res.data && res.data.msg) || `HTTP ${res.statusCode}`));
+			},
+			fail: reject
+		});
+	});
+}
+
+// 上传接口按行返回 NDJSON；uni.request 会尝试按 JSON 解析，这里统一按文本拆行
+function parseLines(data) {
+	const text = typeof data === 'string' ? data : JSON.stringify(data);
+	return text.split('\n').filter(line => line.trim()).map(line => JSON.parse(line));
+}
+
+/**
+ * 同步收件箱，返回每条短信的服务端结论
+ * @param {Array<Object>} messages - 短信对象数组（至少包含 body）
+ * @returns {Promise<Object>} { 哈希: 结论 }，用 verdictFor(verdicts, sms) 取单条短信的结论
+ */
+async function sync(messages) {
+	const bodies = messages.map(sms => sms.body || '').filter(body => body.trim());
+	const hashes = bodies.map(hashText);
+	const digest = digestOf(hashes);
+	const verdicts = uni.getStorageSync(VERDICT_KEY) || {};
+
+	// 1. 只发摘要：收件箱和规则都没变，本地缓存的结论即为最新
+	const missingLocally = hashes.some(h => !verdicts[h]);
+	if (!missingLocally && uni.getStorageSync(DIGEST_KEY) === digest) {
+		const check = await post('/sms/sync', { digest });
+		if (check.unchanged) return verdicts;
+	}
+
+	// 2. 上传全部哈希（每条 32 个字符），取回服务端已有的结论（只命中本人在当前规则下的记录）
+	const res = await post('/sms/sync', { digest, hashes: Array.from(new Set(hashes)).join('') });
+	Object.assign(verdicts, res.known);
+
+	// 3. 只上传没命中的短信，结果逐条返回
+	if (res.unknown.length > 0) {
+		const wanted = new Set(res.unknown);
+		const upload = [];
+		bodies.forEach((body, i) => {
+			if (wanted.delete(hashes[i])) upload.push({ hash: hashes[i], text: body });
+		});
+		const data = await post('/sms/sync/upload', { messages: upload, digest });
+		parseLines(data).forEach(item => {
+			if (item.code === 200) {
+				verdicts[item.hash] = {
+					'编号': item['编号'],
+					'诈骗类别': item['诈骗类别'],
+					'是否诈骗': item['是否诈骗'],
+					'诈骗信息': item['诈骗信息']
+				};
+			}
+		});
+	}
+	uni.setStorageSync(VERDICT_KEY, verdicts);
+	uni.setStorageSync(DIGEST_KEY, digest);
+	return verdicts;
+}
+
+function verdictFor(verdicts, sms) {
+	return sms.body ? verdicts[hashText(sms.body)] : undefined;
+}
+
+export default {
+	sha256,
+	hashText,
+	digestOf,
+	sync,
+	verdictFor
+};